@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+#
+# This code is part of the interface classifier tool distribution
+# and governed by its license.  Please see the LICENSE file that should
+# have been included as part of this package.
+#
+
+"""
+Scoring of docking decoys that share the same receptor.
+
+The receptor is read once and its atoms indexed in a persistent spatial
+grid. Ligand poses are then streamed from a multi-model PDB file or a
+directory of structures and only the ligand atoms are queried against
+the receptor index.
+"""
+
+from __future__ import division, print_function
+
+import os
+
+import numpy as np
+
+from prodigy_cryst.interface_classifier import (
+    ClassificationResult,
+    feature_vector,
+    predict_features,
+)
+from prodigy_cryst.modules import kernels
+
+
+def iter_poses(source, ligand_chains=None):
+    """
+    Yields the arrays of every pose in a multi-model PDB file or in a
+    directory of PDB/mmCIF files (sorted by name). With ligand_chains, only
+    the atoms of those chains are kept.
+    """
+    if os.path.isdir(source):
+        fnames = sorted(
+            f for f in os.listdir(source) if f.split(".")[-1] in ("pdb", "ent", "cif")
+        )
+        poses = (kernels.read_structure(os.path.join(source, f)) for f in fnames)
+    elif str(source).split(".")[-1] in ("pdb", "ent"):
+        poses = kernels.read_pdb_models(source)
+    else:
+        poses = iter([kernels.read_structure(source)])
+
+    for pose in poses:
+        if ligand_chains:
+            pose = select_chains(pose, ligand_chains)
+        yield pose
+
+
+def select_chains(arrays, chains):
+    """
+    Subset of the arrays restricted to the given chains.
+    """
+    keep_res = np.flatnonzero(np.isin(arrays.residues["chain"], list(chains)))
+    new_index = np.full(len(arrays.residues), -1, dtype="i4")
+    new_index[keep_res] = np.arange(len(keep_res))
+    keep = new_index[arrays.res_index] >= 0
+    return kernels.AtomArrays(
+        name=arrays.name,
+        coords=arrays.coords[keep],
+        atom_names=arrays.atom_names[keep],
+        res_index=new_index[arrays.res_index[keep]],
+        residues=arrays.residues[keep_res],
+    )
+
+
+class ReceptorIndex:
+    """
+    Receptor atoms indexed once for repeated contact searches with ligand
+    poses.
+    """
+
+    def __init__(self, receptor, d_cutoff=5.0, receptor_chains=None):
+        arrays = kernels.read_structure(receptor)
+        if receptor_chains:
+            arrays = select_chains(arrays, receptor_chains)
+        self.arrays = arrays
+        self.d_cutoff = d_cutoff
+        self.grid = kernels.AtomGrid(arrays.coords, cell=d_cutoff)
+        self.chain_ids = list(dict.fromkeys(arrays.residues["chain"].tolist()))
+        self.chains = ",".join(self.chain_ids)
+
+    def ligand(self, pose, ligand_chains=None):
+        """
+        Ligand part of a pose: the given chains, or else all the chains
+        that are not part of the receptor.
+        """
+        if ligand_chains:
+            return select_chains(pose, ligand_chains)
+        pose_chains = dict.fromkeys(pose.residues["chain"].tolist())
+        return select_chains(pose, [c for c in pose_chains if c not in self.chain_ids])
+
+    def contacts(self, ligand):
+        """
+        Residue pairs in contact between the receptor and a ligand pose.
+
+        Returns a (n_contacts, 2) array of indices into the joint residue
+        table, receptor residues first, and that table.
+        """
+        overlap = set(self.chain_ids) & set(ligand.residues["chain"].tolist())
+        if overlap:
+            raise ValueError(
+                "[!] Ligand chains overlap with the receptor: {0}".format(
+                    ",".join(sorted(overlap))
+                )
+            )
+        residues = np.concatenate([self.arrays.residues, ligand.residues])
+        i_lig, i_rec = self.grid.query(ligand.coords, self.d_cutoff)
+        pairs = np.stack(
+            [
+                self.arrays.res_index[i_rec],
+                ligand.res_index[i_lig] + len(self.arrays.residues),
+            ],
+            axis=1,
+        )
+        n_res = len(residues)
+        codes = np.unique(pairs[:, 0].astype("i8") * n_res + pairs[:, 1])
+        return np.stack(np.divmod(codes, n_res), axis=1), residues
+
+    def features(self, ligand):
+        """
+        Contacts, joint residue table, bins and link density of a pose.
+        """
+        contacts, residues = self.contacts(ligand)
+        bins = kernels.bin_contacts(contacts, residues)
+        ld = kernels.link_density(contacts) if len(contacts) else 0.0
+        return contacts, residues, bins, ld
+
+
+def score_poses(receptor, poses, ligand_chains=None, d_cutoff=5.0, batch_size=256):
+    """
+    Classifies the interface of a receptor with each of a series of ligand
+    poses.
+
+    receptor can be a path, a structure or a ReceptorIndex; poses a
+    multi-model PDB file, a directory or an iterable of structures. The
+    ligand is made of ligand_chains, or by default of all the chains of
+    each pose that are not in the receptor. Poses are processed in batches
+    of batch_size, each classified with a single call to the model. Yields
+    one ClassificationResult per pose; poses without any contact with the
+    receptor have a predicted_class of None.
+    """
+    if not isinstance(receptor, ReceptorIndex):
+        receptor = ReceptorIndex(receptor, d_cutoff=d_cutoff)
+    if isinstance(poses, (str, os.PathLike)):
+        poses = iter_poses(poses)
+    else:
+        poses = (kernels.read_structure(p) for p in poses)
+    poses = (receptor.ligand(p, ligand_chains) for p in poses)
+
+    def _flush(batch):
+        scored = [b for b in batch if len(b[1])]
+        predictions = iter(
+            predict_features([feature_vector(b[3], b[4]) for b in scored])
+            if scored
+            else []
+        )
+        for pose, contacts, residues, bins, ld in batch:
+            pose_chains = ",".join(dict.fromkeys(pose.residues["chain"].tolist()))
+            yield ClassificationResult(
+                structure=pose.name,
+                selection=(receptor.chains, pose_chains),
+                contacts=contacts,
+                residues=residues,
+                bins=bins,
+                link_density=ld,
+                predicted_class=next(predictions) if len(contacts) else None,
+            )
+
+    batch = []
+    for pose in poses:
+        batch.append((pose,) + receptor.features(pose))
+        if batch_size and len(batch) == batch_size:
+            for result in _flush(batch):
+                yield result
+            batch = []
+    for result in _flush(batch):
+        yield result
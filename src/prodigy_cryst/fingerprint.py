@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+#
+# This code is part of the interface classifier tool distribution
+# and governed by its license.  Please see the LICENSE file that should
+# have been included as part of this package.
+#
+
+"""
+Per chain-pair classification with deduplication of equivalent interfaces.
+
+Homo-oligomers and crystal structures contain many copies of the same
+interface. Chain pairs are fingerprinted from the sequences of both chains
+and their pose is compared with the interfaces already seen by
+superposing the interface atoms. The full-atom contact search is only run
+on one representative per group of equivalent interfaces. The contacts of
+the copies are mapped from it by chain position, and only the residue
+pairs that the superposition cannot decide are checked on their own
+coordinates, so that every interface gets its exact contacts.
+"""
+
+from __future__ import division, print_function
+
+import hashlib
+
+import numpy as np
+
+from prodigy_cryst.interface_classifier import (
+    ClassificationResult,
+    feature_vector,
+    predict_features,
+)
+from prodigy_cryst.modules import kernels
+
+
+def _superpose(mobile, target):
+    """
+    Fits mobile onto target (Kabsch). Returns the fitted coordinates and
+    the RMSD.
+    """
+    p = mobile - mobile.mean(axis=0)
+    q = target - target.mean(axis=0)
+    u, _, vt = np.linalg.svd(p.T @ q)
+    d = 1.0 if np.linalg.det(u @ vt) >= 0 else -1.0
+    fitted = p @ (u @ np.diag([1.0, 1.0, d]) @ vt) + target.mean(axis=0)
+    return fitted, float(np.sqrt(((fitted - target) ** 2).sum(axis=1).mean()))
+
+
+def chain_interfaces(arrays, d_cutoff=5.0):
+    """
+    Lists the chain pairs of a structure that may be in contact, from the
+    residue pairs whose side-chain centroids are close enough for their
+    atoms to be within d_cutoff (given the largest atom to centroid
+    distance of each residue).
+
+    Yields (chain_a, chain_b, fingerprint, candidates) per pair, the chains
+    in canonical order, candidates being the (n, 2) residue indices of
+    those pairs, chain_a residues first.
+    """
+    residues = arrays.residues
+    centroids = kernels.residue_centroids(arrays)
+    radius = np.zeros(len(residues))
+    np.maximum.at(
+        radius,
+        arrays.res_index,
+        np.linalg.norm(arrays.coords - centroids[arrays.res_index], axis=1),
+    )
+
+    chains = list(dict.fromkeys(residues["chain"].tolist()))
+    chain_of = residues["chain"]
+    sequences = dict(
+        (c, "-".join(residues["resname"][chain_of == c].tolist())) for c in chains
+    )
+    candidates = kernels.find_contacts(
+        kernels.reduced_arrays(arrays),
+        dict((c, i) for i, c in enumerate(chains)),
+        cutoff=d_cutoff + 2 * radius.max() + 1e-6,
+    )
+    reach = d_cutoff + radius[candidates[:, 0]] + radius[candidates[:, 1]] + 1e-6
+    diff = centroids[candidates[:, 0]] - centroids[candidates[:, 1]]
+    candidates = candidates[np.einsum("ij,ij->i", diff, diff) <= reach * reach]
+
+    chain_pairs = np.stack([chain_of[candidates[:, 0]], chain_of[candidates[:, 1]]])
+    for chain_a, chain_b in dict.fromkeys(zip(*chain_pairs.tolist())):
+        pairs = candidates[(chain_pairs[0] == chain_a) & (chain_pairs[1] == chain_b)]
+        # Canonical orientation: the same key for A-B and B-A copies
+        if sequences[chain_b] < sequences[chain_a]:
+            chain_a, chain_b, pairs = chain_b, chain_a, pairs[:, ::-1]
+        seqs = (sequences[chain_a], sequences[chain_b])
+        fingerprint = hashlib.sha1(repr(seqs).encode()).hexdigest()
+        yield str(chain_a), str(chain_b), fingerprint, pairs
+
+
+class _Interface:
+    """
+    A chain pair in a given orientation, with its residues addressed by
+    their position in each chain.
+    """
+
+    def __init__(self, arrays, chain_a, chain_b, candidates):
+        self.arrays = arrays
+        self.chains = (chain_a, chain_b)
+        chain_of = arrays.residues["chain"]
+        # residue index of each chain position
+        self.index = [np.flatnonzero(chain_of == c) for c in self.chains]
+        position = np.zeros(len(chain_of), dtype="i8")
+        for index in self.index:
+            position[index] = np.arange(len(index))
+        self.pos = position[candidates]
+        self.candidates = candidates
+
+    def swapped(self):
+        return _Interface(
+            self.arrays, self.chains[1], self.chains[0], self.candidates[:, ::-1]
+        )
+
+    def codes(self, pos):
+        return pos[:, 0] * len(self.index[1]) + pos[:, 1]
+
+    def residue_pairs(self, pos):
+        return np.stack([self.index[0][pos[:, 0]], self.index[1][pos[:, 1]]], axis=1)
+
+    def symmetric(self):
+        resnames = self.arrays.residues["resname"]
+        return np.array_equal(resnames[self.index[0]], resnames[self.index[1]])
+
+    def atoms(self, positions):
+        """
+        Atoms of the residues at the given positions of each chain, sorted
+        by chain, position and name. Returns their chain side, position,
+        name and coordinates.
+        """
+        arrays = self.arrays
+        res_side = np.full(len(arrays.residues), -1, dtype="i8")
+        res_pos = np.zeros(len(arrays.residues), dtype="i8")
+        for side in (0, 1):
+            index = self.index[side][positions[side]]
+            res_side[index] = side
+            res_pos[index] = positions[side]
+        sel = np.flatnonzero(res_side[arrays.res_index] >= 0)
+        side = res_side[arrays.res_index[sel]]
+        pos = res_pos[arrays.res_index[sel]]
+        names = arrays.atom_names[sel]
+        order = np.lexsort((names, pos, side))
+        return side[order], pos[order], names[order], arrays.coords[sel[order]]
+
+
+def _search(iface, d_cutoff):
+    """
+    Full-atom contacts of a representative interface. Keeps the distances
+    of all its candidate pairs so that copies can be mapped onto it.
+    """
+    d2 = kernels.pair_distances(iface.arrays, iface.candidates)
+    codes = iface.codes(iface.pos)
+    order = np.argsort(codes)
+    positions = [np.unique(iface.pos[:, side]) for side in (0, 1)]
+    *keys, xyz = iface.atoms(positions)
+    return {
+        "codes": codes[order],
+        "d": np.sqrt(d2[order]),
+        "positions": positions,
+        "keys": keys,
+        "xyz": xyz,
+        "contacts": iface.pos[d2 <= d_cutoff * d_cutoff],
+    }
+
+
+def _map_contacts(iface, rep, d_cutoff, rmsd_cutoff):
+    """
+    Contacts of an interface equivalent to a representative, by chain
+    position, and the number of residue pairs checked on its own
+    coordinates. Returns None if it is not equivalent.
+    """
+    codes = iface.codes(iface.pos)
+    i_rep = np.searchsorted(rep["codes"], codes)
+    i_rep[i_rep == len(rep["codes"])] = 0
+    known = rep["codes"][i_rep] == codes
+    *keys, xyz = iface.atoms(rep["positions"])
+    if not all(np.array_equal(k, rep_k) for k, rep_k in zip(keys, rep["keys"])):
+        return None
+    fitted, rmsd = _superpose(xyz, rep["xyz"])
+    if rmsd > rmsd_cutoff:
+        return None
+
+    # Distances of a residue pair differ from the representative by at most
+    # the largest deviation of an atom of each residue after superposition
+    deviation = [np.zeros(len(index)) for index in iface.index]
+    atom_dev = np.linalg.norm(fitted - rep["xyz"], axis=1)
+    for side in (0, 1):
+        on_side = keys[0] == side
+        np.maximum.at(deviation[side], keys[1][on_side], atom_dev[on_side])
+    bound = deviation[0][iface.pos[:, 0]] + deviation[1][iface.pos[:, 1]] + 1e-6
+    rep_d = np.where(known, rep["d"][i_rep], np.inf)
+
+    # Pairs that are not candidates of the representative are checked too
+    is_contact = rep_d + bound < d_cutoff
+    unsure = ~known | (np.abs(rep_d - d_cutoff) <= bound)
+    d2 = kernels.pair_distances(iface.arrays, iface.candidates[unsure])
+    is_contact[unsure] = d2 <= d_cutoff * d_cutoff
+    return iface.pos[is_contact], int(np.count_nonzero(unsure))
+
+
+def classify_interfaces(structs, d_cutoff=5.0, rmsd_cutoff=1.0):
+    """
+    Classifies every chain-pair interface of a batch of structures.
+
+    Interfaces with the same sequences whose interface atoms superpose
+    within rmsd_cutoff are equivalent: the full-atom contact search only
+    runs on the first of them and the others get its contacts mapped by
+    chain position, checking on their own coordinates only the residue
+    pairs whose distance could be on either side of d_cutoff. Features are
+    computed once per distinct set of contacts.
+
+    Returns the list of ClassificationResult, one per interface with
+    contacts, and a report with the number of interfaces, of full-atom
+    searches (unique), of candidate residue pairs mapped from a
+    representative (mapped_pairs) and of those checked again (rechecked).
+    """
+    # fingerprint -> [representative data]
+    representatives = {}
+    interfaces = []
+    n_mapped = n_rechecked = 0
+    for struct in structs:
+        arrays = kernels.read_structure(struct)
+        for chain_a, chain_b, fingerprint, candidates in chain_interfaces(
+            arrays, d_cutoff=d_cutoff
+        ):
+            iface = _Interface(arrays, chain_a, chain_b, candidates)
+            orientations = [iface]
+            if iface.symmetric():
+                orientations.append(iface.swapped())
+
+            mapped = None
+            for rep in representatives.get(fingerprint, []):
+                for oriented in orientations:
+                    mapped = _map_contacts(oriented, rep, d_cutoff, rmsd_cutoff)
+                    if mapped is not None:
+                        iface = oriented
+                        break
+                if mapped is not None:
+                    break
+
+            if mapped is None:
+                rep = _search(iface, d_cutoff)
+                representatives.setdefault(fingerprint, []).append(rep)
+                contacts = rep["contacts"]
+            else:
+                contacts, rechecked = mapped
+                n_mapped += len(iface.pos)
+                n_rechecked += rechecked
+            if len(contacts):
+                interfaces.append((iface, fingerprint, contacts, mapped is None))
+
+    # Features once per distinct set of contacts, classified in one go
+    features = {}
+    feature_ids = []
+    for iface, fingerprint, contacts, _ in interfaces:
+        key = (fingerprint, iface.codes(contacts).tobytes())
+        if key not in features:
+            pairs = kernels.orient_pairs(
+                iface.residue_pairs(contacts), iface.arrays.residues
+            )
+            features[key] = (
+                kernels.bin_contacts(pairs, iface.arrays.residues),
+                kernels.link_density(pairs),
+            )
+        feature_ids.append(key)
+
+    keys = list(features)
+    predictions = dict(
+        zip(
+            keys,
+            predict_features([feature_vector(*features[k]) for k in keys])
+            if keys
+            else [],
+        )
+    )
+
+    results = []
+    for (iface, _, contacts, _), key in zip(interfaces, feature_ids):
+        bins, ld = features[key]
+        results.append(
+            ClassificationResult(
+                structure=iface.arrays.name,
+                selection=iface.chains,
+                contacts=kernels.orient_pairs(
+                    iface.residue_pairs(contacts), iface.arrays.residues
+                ),
+                residues=iface.arrays.residues,
+                bins=dict(bins),
+                link_density=ld,
+                predicted_class=predictions[key],
+            )
+        )
+
+    report = {
+        "interfaces": len(interfaces),
+        "unique": sum(1 for i in interfaces if i[3]),
+        "mapped_pairs": n_mapped,
+        "rechecked": n_rechecked,
+    }
+    return results, report
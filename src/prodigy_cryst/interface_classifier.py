@@ -18,20 +18,112 @@ import pickle
 
 # import os
 import sys
+import threading
+import time
 import warnings
+from collections import Counter, namedtuple
 from pathlib import Path
 
+import numpy as np
+
 try:
     from Bio.PDB import NeighborSearch
 except ImportError as e:
     logging.error("[!] The interface classifier tool requires Biopython")
     raise ImportError(e)
 
-from prodigy_cryst.modules import aa_properties
+from prodigy_cryst.modules import aa_properties, kernels
+from prodigy_cryst.modules.contact_map import write_contact_map
 from prodigy_cryst.modules.parsers import parse_structure
 
 # from prodigy_cryst.lib.freesasa import execute_freesasa
 from prodigy_cryst.modules.utils import _check_path
+from prodigy_cryst.modules.writers import ResultWriter
+
+# Bins used as features by the classifier, followed by the link density
+feature_bins = [
+    "CP",
+    "AC",
+    "AP",
+    "AA",
+    "ALA",
+    "CYS",
+    "GLU",
+    "ASP",
+    "GLY",
+    "PHE",
+    "ILE",
+    "HIS",
+    "MET",
+    "LEU",
+    "GLN",
+    "PRO",
+    "SER",
+    "ARG",
+    "THR",
+    "VAL",
+    "TYR",
+]
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def load_model():
+    """
+    Loads the classifier once and shares it between calls (and threads).
+    """
+    global _model
+    with _model_lock:
+        if _model is None:
+            model_f = Path(Path(__file__).resolve().parent, "data", "classifier.sav")
+            # Unpickling raises some warnings about modules that will be deprecated
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                with open(model_f, "rb") as fh:
+                    _model = pickle.load(fh)
+    return _model
+
+
+def feature_vector(bins, link_density):
+    """
+    Features of an interface, in the order expected by the classifier.
+    """
+    return [bins[x] for x in feature_bins] + [link_density]
+
+
+def predict_features(feature_matrix):
+    """
+    Classifies a batch of interfaces given their feature vectors.
+
+    Returns one (class, p_bio, p_xtal) tuple per row.
+    """
+    model = load_model()
+    probas = model.predict_proba(np.asarray(feature_matrix, dtype="f8"))
+    return [
+        (["BIO", "XTAL"][int(np.argmax(proba))], proba[0], proba[1])
+        for proba in probas.tolist()
+    ]
+
+
+def make_selection_dict(selection, chains):
+    """
+    Maps each chain to its selection group. Without selection, every chain
+    is a group of its own.
+    """
+    if not selection:
+        return dict([(c, nc) for nc, c in enumerate(chains)])
+
+    selection_dict = {}
+    for igroup, group in enumerate(selection):
+        for chain in group.split(","):
+            if chain in selection_dict:
+                errmsg = "Selections must be disjoint sets: {0} is repeated".format(
+                    chain
+                )
+                raise ValueError(errmsg)
+            selection_dict[chain] = igroup
+    return selection_dict
 
 
 def calculate_ic(structure, d_cutoff=5.0, selection=None):
@@ -69,34 +161,7 @@ def analyse_contacts(contact_list):
     of the participating amino acids.
     """
 
-    bins = {
-        "AA": 0,
-        "PP": 0,
-        "CC": 0,
-        "AP": 0,
-        "CP": 0,
-        "AC": 0,
-        "ALA": 0,
-        "CYS": 0,
-        "GLU": 0,
-        "ASP": 0,
-        "GLY": 0,
-        "PHE": 0,
-        "ILE": 0,
-        "HIS": 0,
-        "LYS": 0,
-        "MET": 0,
-        "LEU": 0,
-        "ASN": 0,
-        "GLN": 0,
-        "PRO": 0,
-        "SER": 0,
-        "ARG": 0,
-        "THR": 0,
-        "TRP": 0,
-        "VAL": 0,
-        "TYR": 0,
-    }
+    bins = dict.fromkeys(kernels.bin_names, 0)
 
     _data = aa_properties.aa_character_ic
     for res_i, res_j in contact_list:
@@ -109,6 +174,89 @@ def analyse_contacts(contact_list):
     return bins
 
 
+class ClassificationResult(
+    namedtuple(
+        "ClassificationResult",
+        [
+            "structure",
+            "selection",
+            "contacts",
+            "residues",
+            "bins",
+            "link_density",
+            "predicted_class",
+            "approximate",
+        ],
+        defaults=(False,),
+    )
+):
+    """
+    Immutable outcome of classify().
+
+    contacts is a (n_contacts, 2) array of indices into the residues table.
+    approximate flags results computed from a reduced representation
+    (see prodigy_cryst.screening).
+    """
+
+    __slots__ = ()
+
+    def as_dict(self):
+        return_dict = {
+            "structure": self.structure,
+            "selection": list(self.selection),
+            "ICs": len(self.contacts),
+            "link_density": self.link_density,
+            "predicted_class": self.predicted_class,
+        }
+        return_dict.update(self.bins)
+        return return_dict
+
+
+def interface_features(struct, selection=None, d_cutoff=5.0):
+    """
+    Computes the contacts, bins and link density of an interface with the
+    array kernels. struct can be a path, a Biopython structure or
+    kernels.AtomArrays. Returns the arrays, selection, contacts, bins and
+    link density.
+    """
+    arrays = kernels.read_structure(struct)
+    chains = list(dict.fromkeys(arrays.residues["chain"].tolist()))
+    if not selection:
+        selection = chains
+    selection_dict = make_selection_dict(selection, chains)
+
+    contacts = kernels.find_contacts(arrays, selection_dict, cutoff=d_cutoff)
+    if not len(contacts):
+        raise ValueError("No contacts found for selection")
+
+    bins = kernels.bin_contacts(contacts, arrays.residues)
+    link_density = kernels.link_density(contacts)
+    return arrays, selection, contacts, bins, link_density
+
+
+def classify(struct, selection=None, d_cutoff=5.0):
+    """
+    Re-entrant classification of an interface.
+
+    Does not modify its input nor any shared state and writes nothing, so
+    it can be called concurrently from a thread pool. Returns a
+    ClassificationResult.
+    """
+    arrays, selection, contacts, bins, link_density = interface_features(
+        struct, selection=selection, d_cutoff=d_cutoff
+    )
+    prediction = predict_features([feature_vector(bins, link_density)])[0]
+    return ClassificationResult(
+        structure=arrays.name,
+        selection=tuple(selection),
+        contacts=contacts,
+        residues=arrays.residues,
+        bins=bins,
+        link_density=link_density,
+        predicted_class=prediction,
+    )
+
+
 class ProdigyCrystal:
     # init parameters
     def __init__(self, struct_obj, selection=None):
@@ -119,6 +267,7 @@ class ProdigyCrystal:
         self.structure = struct_obj
         self.ic_network = {}
         self.bins = {}
+        self._index = None
         self.nis_a = 0
         self.nis_c = 0
         self.ba_val = 0
@@ -126,29 +275,20 @@ class ProdigyCrystal:
 
     def predict(self, temp=None, distance_cutoff=5.5, acc_threshold=0.05):
         # Make selection dict from user option or PDB chains
-        if self.selection:
-            selection_dict = {}
-            for igroup, group in enumerate(self.selection):
-                chains = group.split(",")
-                for chain in chains:
-                    if chain in selection_dict:
-                        errmsg = (
-                            "Selections must be disjoint sets: {0} is repeated".format(
-                                chain
-                            )
-                        )
-                        raise ValueError(errmsg)
-                    selection_dict[chain] = igroup
-        else:
-            selection_dict = dict(
-                [(c.id, nc) for nc, c in enumerate(self.structure.get_chains())]
-            )
+        selection_dict = make_selection_dict(
+            self.selection, [c.id for c in self.structure.get_chains()]
+        )
 
         # Contacts
         self.ic_network = calculate_ic(self.structure, selection=selection_dict)
 
         self.bins = analyse_contacts(self.ic_network)
 
+        # State for incremental updates
+        self._selection_dict = selection_dict
+        self._index = None
+        self._resnames = dict((r, r.resname) for pair in self.ic_network for r in pair)
+
         # =====
         # This is not used!
         # SASA
@@ -157,56 +297,126 @@ class ProdigyCrystal:
 
         # Link density
         list1, list2 = zip(*(self.ic_network))
+        self._sides = (Counter(list1), Counter(list2))
         max_contacts = len(set(list1)) * len(set(list2))
         self.link_density = len(self.ic_network) / max_contacts
 
         # Predict and print out interface type
-        features = [
-            str(self.bins[x])
-            for x in [
-                "CP",
-                "AC",
-                "AP",
-                "AA",
-                "ALA",
-                "CYS",
-                "GLU",
-                "ASP",
-                "GLY",
-                "PHE",
-                "ILE",
-                "HIS",
-                "MET",
-                "LEU",
-                "GLN",
-                "PRO",
-                "SER",
-                "ARG",
-                "THR",
-                "VAL",
-                "TYR",
-            ]
-        ]
-        features.append(str(len(self.ic_network) / max_contacts))
-        # Q: Why is this calling classify?
-        # base_path = os.path.dirname(os.path.realpath(__file__))
-        # prediction = os.popen(
-        #     os.path.join(base_path, "prodigy_cryst", "classify.py")
-        #     + " "
-        #     + " ".join(features)
-        # ).read()
-        model_f = Path(
-            Path(__file__).resolve().parent.parent, "prodigy_cryst/data/classifier.sav"
-        )
-        # Calling this will raise some warning about modules that will be deprecated
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            with open(model_f, "rb") as fh:
-                model = pickle.load(fh)
-            proba = list(model.predict_proba([features])[0])
-            prediction = ["BIO", "XTAL"][proba.index(max(proba))], proba[0], proba[1]
+        features = feature_vector(self.bins, self.link_density)
+        prediction = predict_features([features])[0]
         self.predicted_class = prediction
 
+    def update(self, residues, d_cutoff=5.0, max_stale=0.1):
+        """
+        Re-classifies the interface after some residues were edited in place
+        (new coordinates, residue names or atoms), e.g. point mutations or
+        side-chain moves.
+
+        Only the modified residues are searched for contacts, against a
+        spatial index of the structure kept between calls. The contacts,
+        bins and link density of the previous evaluation are updated with
+        the differences and the interface is scored again. The index is
+        rebuilt once more than max_stale of the residues were modified.
+        """
+        if self._index is None and not self.ic_network:
+            raise ValueError("[!] predict() must be called before update()")
+
+        modified = set(residues)
+        if self._index is None or len(self._index["stale"]) > max_stale * len(
+            self._index["residues"]
+        ):
+            self._build_index(d_cutoff)
+        self._index["stale"] |= modified
+
+        kept = []
+        for res1, res2 in self.ic_network:
+            if res1 in modified or res2 in modified:
+                self._count_contact(res1, res2, -1)
+            else:
+                kept.append((res1, res2))
+
+        new_contacts = self._query_index(modified, d_cutoff)
+        for res1, res2 in new_contacts:
+            self._resnames[res1] = res1.resname
+            self._resnames[res2] = res2.resname
+            self._count_contact(res1, res2, 1)
+
+        self.ic_network = kept + new_contacts
+        if not self.ic_network:
+            raise ValueError("No contacts found for selection")
+
+        max_contacts = len(self._sides[0]) * len(self._sides[1])
+        self.link_density = len(self.ic_network) / max_contacts
+
+        features = feature_vector(self.bins, self.link_density)
+        self.predicted_class = predict_features([features])[0]
+
+    def _build_index(self, d_cutoff):
+        res_list = list(self.structure.get_residues())
+        coords = [a.coord for r in res_list for a in r]
+        self._index = {
+            "grid": kernels.AtomGrid(np.array(coords).reshape(-1, 3), cell=d_cutoff),
+            "residues": res_list,
+            "res_index": np.repeat(
+                np.arange(len(res_list)), [len(r) for r in res_list]
+            ),
+            "stale": set(),
+        }
+
+    def _query_index(self, modified, d_cutoff):
+        """
+        Residue pairs in contact involving at least one modified residue,
+        using the current coordinates.
+        """
+        index = self._index
+        res_list = index["residues"]
+        modified = list(modified)
+        query_res = [r for r in modified for _ in r]
+        query_xyz = np.array([a.coord for r in modified for a in r], dtype="f8")
+
+        # Unmodified residues: persistent index
+        i_query, i_atom = index["grid"].query(query_xyz.reshape(-1, 3), d_cutoff)
+        stale = [i for i, r in enumerate(res_list) if r in index["stale"]]
+        fresh = ~np.isin(index["res_index"][i_atom], stale)
+        found = set(
+            (query_res[i], res_list[j])
+            for i, j in zip(i_query[fresh], index["res_index"][i_atom[fresh]])
+        )
+
+        # Residues modified now or before: current coordinates
+        others = [res_list[i] for i in stale]
+        other_res = [r for r in others for _ in r]
+        other_xyz = np.array([a.coord for r in others for a in r], dtype="f8")
+        i_query, i_other = kernels.atom_contacts(
+            query_xyz.reshape(-1, 3), other_xyz.reshape(-1, 3), d_cutoff
+        )
+        found.update((query_res[i], other_res[j]) for i, j in zip(i_query, i_other))
+
+        _sd = self._selection_dict
+        contacts = set()
+        for res1, res2 in found:
+            chain1, chain2 = res1.parent.id, res2.parent.id
+            if chain1 in _sd and chain2 in _sd and _sd[chain1] != _sd[chain2]:
+                contacts.add((res1, res2) if res1 < res2 else (res2, res1))
+        return sorted(contacts)
+
+    def _count_contact(self, res1, res2, sign):
+        """
+        Adds (sign=1) or removes (sign=-1) a contact from the bins and the
+        residue counts of each side of the interface.
+        """
+        _data = aa_properties.aa_character_ic
+        name1, name2 = self._resnames[res1], self._resnames[res2]
+        contact_type = "".join(sorted((_data.get(name1), _data.get(name2))))
+        self.bins[contact_type] += sign
+        self.bins[name1] += sign
+        self.bins[name2] += sign
+
+        for side, res in zip(self._sides, (res1, res2)):
+            side[res] += sign
+            if side[res] <= 0:
+                del side[res]
+
     def as_dict(self):
         return_dict = {
             "structure": self.structure.id,
@@ -277,6 +487,11 @@ class ProdigyCrystal:
         if handle is not sys.stdout:
             handle.close()
 
+    def export_contacts(self, outfile, distances=False):
+        return write_contact_map(
+            self.ic_network, outfile, selection=self.selection, distances=distances
+        )
+
 
 def main():
 
@@ -294,6 +509,16 @@ def main():
     ap.add_argument(
         "--contact_list", action="store_true", help="Output a list of contacts"
     )
+    ap.add_argument(
+        "--contact_map",
+        action="store_true",
+        help="Output the contacts as a sparse matrix (.npz)",
+    )
+    ap.add_argument(
+        "--distances",
+        action="store_true",
+        help="Include the minimum atom-atom distance of each contact in the map",
+    )
     ap.add_argument(
         "-q",
         "--quiet",
@@ -319,6 +544,10 @@ def main():
     """
     sel_opt = ap.add_argument_group("Selection Options", description=_co_help)
     sel_opt.add_argument("--selection", nargs="+", metavar=("A B", "A,B C"))
+    ap.add_argument(
+        "--output",
+        help="Append the results as a row of a .csv, .tsv or .jsonl file (optionally .gz)",
+    )
 
     cmd = ap.parse_args()
 
@@ -330,12 +559,23 @@ def main():
     struct_path = _check_path(cmd.structf)
 
     # Parse structure
+    t0 = time.time()
     structure, n_chains, n_res = parse_structure(struct_path)
+    t1 = time.time()
     prodigy = ProdigyCrystal(structure, cmd.selection)
     prodigy.predict()
+    t2 = time.time()
     prodigy.print_prediction(quiet=cmd.quiet)
 
+    if cmd.output:
+        with ResultWriter(cmd.output, append=True, resume=False) as writer:
+            writer.write(prodigy, timings={"parse": t1 - t0, "predict": t2 - t1})
+
     # Print out interaction network
     if cmd.contact_list:
         fname = struct_path[:-4] + ".ic"
         prodigy.print_contacts(fname)
+
+    if cmd.contact_map:
+        fname = struct_path[:-4] + ".npz"
+        prodigy.export_contacts(fname, distances=cmd.distances)
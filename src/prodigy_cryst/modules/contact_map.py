@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+#
+# This code is part of the interface classifier tool distribution
+# and governed by its license.  Please see the LICENSE file that should
+# have been included as part of this package.
+#
+
+"""
+Binary (sparse) export of interface contact networks.
+"""
+
+from __future__ import division, print_function
+
+import numpy as np
+
+# Residue index tables are stored as plain structured arrays so that the
+# files can be reloaded without pickle.
+residue_dtype = np.dtype(
+    [("chain", "U4"), ("resnum", "i4"), ("icode", "U1"), ("resname", "U3")]
+)
+
+
+def _residue_table(residues):
+    """
+    Builds a structured array describing a list of residues.
+    """
+    table = np.empty(len(residues), dtype=residue_dtype)
+    table["chain"] = [r.parent.id for r in residues]
+    table["resnum"] = [r.id[1] for r in residues]
+    table["icode"] = [r.id[2].strip() for r in residues]
+    table["resname"] = [r.resname for r in residues]
+    return table
+
+
+def _padded_coords(residues, pad=1.0e6):
+    """
+    Stacks the atomic coordinates of a list of residues in a single
+    (n_residues, max_atoms, 3) array. Missing atoms are placed at ``pad``
+    so that they never define a minimum distance.
+    """
+    max_atoms = max(len(r) for r in residues)
+    coords = np.full((len(residues), max_atoms, 3), pad, dtype="f8")
+    for i_res, res in enumerate(residues):
+        coords[i_res, : len(res)] = [a.coord for a in res]
+    return coords
+
+
+def contact_distances(ic_network):
+    """
+    Returns the minimum heavy atom distance of each residue pair in
+    a contact network.
+    """
+    if not ic_network:
+        return np.empty(0, dtype="f4")
+
+    list1, list2 = zip(*ic_network)
+    # pad on opposite sides so that padding never pairs with padding
+    xyz_1 = _padded_coords(list1, pad=1.0e6)
+    xyz_2 = _padded_coords(list2, pad=-1.0e6)
+    diff = xyz_1[:, :, None, :] - xyz_2[:, None, :, :]
+    d2 = np.einsum("pijk,pijk->pij", diff, diff)
+    return np.sqrt(d2.reshape(len(ic_network), -1).min(axis=1)).astype("f4")
+
+
+def _chain_groups(ic_network, selection=None):
+    """
+    Selection group index of each chain. Without selection, every chain is
+    a group of its own, in the order of the chain identifiers.
+    """
+    if not selection:
+        chains = sorted(set(r.parent.id for pair in ic_network for r in pair))
+        return dict((chain, igroup) for igroup, chain in enumerate(chains))
+    return dict(
+        (chain, igroup)
+        for igroup, group in enumerate(selection)
+        for chain in group.split(",")
+    )
+
+
+def build_contact_map(ic_network, selection=None, distances=False):
+    """
+    Converts a list of residue pairs into a sparse (COO) contact map.
+
+    Each pair is oriented so that rows index the residue of the lowest
+    selection group (see _chain_groups) and columns the other one. With two
+    groups, rows are the residues of selection[0]; with more, a residue of
+    an intermediate group can appear in both tables. The group of every
+    residue is stored in group_a and group_b.
+    """
+    groups = _chain_groups(ic_network, selection)
+    oriented = []
+    for res1, res2 in ic_network:
+        if groups[res1.parent.id] > groups[res2.parent.id]:
+            res1, res2 = res2, res1
+        oriented.append((res1, res2))
+
+    rows, cols = {}, {}
+    row_idx = np.empty(len(oriented), dtype="i4")
+    col_idx = np.empty(len(oriented), dtype="i4")
+    for i_pair, (res1, res2) in enumerate(oriented):
+        row_idx[i_pair] = rows.setdefault(res1, len(rows))
+        col_idx[i_pair] = cols.setdefault(res2, len(cols))
+
+    contact_map = {
+        "row": row_idx,
+        "col": col_idx,
+        "shape": np.array([len(rows), len(cols)], dtype="i4"),
+        "residues_a": _residue_table(list(rows)),
+        "residues_b": _residue_table(list(cols)),
+        "group_a": np.array([groups[r.parent.id] for r in rows], dtype="i4"),
+        "group_b": np.array([groups[r.parent.id] for r in cols], dtype="i4"),
+    }
+    if distances:
+        contact_map["distance"] = contact_distances(oriented)
+    return contact_map
+
+
+def write_contact_map(ic_network, outfile, selection=None, distances=False):
+    """
+    Writes a contact network to a compressed ``.npz`` file in one go.
+    """
+    contact_map = build_contact_map(
+        ic_network, selection=selection, distances=distances
+    )
+    np.savez_compressed(outfile, **contact_map)
+    return contact_map
+
+
+def load_contact_map(path):
+    """
+    Reads a contact map written by ``write_contact_map``.
+
+    Returns a dictionary with the COO ``row``/``col`` indices, the map
+    ``shape``, the ``residues_a``/``residues_b`` index tables, their
+    ``group_a``/``group_b`` selection groups and, if it was exported, the
+    per-pair minimum ``distance``.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        contact_map = {key: data[key] for key in data.files}
+    contact_map["shape"] = tuple(int(x) for x in contact_map["shape"])
+    contact_map.setdefault("distance", None)
+    contact_map.setdefault("group_a", None)
+    contact_map.setdefault("group_b", None)
+    return contact_map
+
+
+def to_dense(contact_map, fill=0):
+    """
+    Expands a contact map into a dense matrix. Cells hold the minimum
+    distance if available, 1 otherwise.
+    """
+    if contact_map.get("distance") is not None:
+        values = contact_map["distance"]
+        dense = np.full(contact_map["shape"], fill, dtype=values.dtype)
+    else:
+        values = 1
+        dense = np.full(contact_map["shape"], fill, dtype="i1")
+    dense[contact_map["row"], contact_map["col"]] = values
+    return dense
@@ -0,0 +1,563 @@
+#!/usr/bin/env python
+#
+# This code is part of the interface classifier tool distribution
+# and governed by its license.  Please see the LICENSE file that should
+# have been included as part of this package.
+#
+
+"""
+Array-based kernels for the interface classification pipeline.
+
+These functions work on flat NumPy arrays instead of Biopython objects,
+keep no state between calls and do their heavy lifting in NumPy routines
+that release the GIL, so they can be safely run from several threads.
+"""
+
+from __future__ import division, print_function
+
+import os
+from collections import namedtuple
+from itertools import combinations
+
+import numpy as np
+
+from prodigy_cryst.modules import aa_properties
+from prodigy_cryst.modules.contact_map import residue_dtype
+
+AtomArrays = namedtuple(
+    "AtomArrays", ["name", "coords", "atom_names", "res_index", "residues"]
+)
+AtomArrays.__doc__ = """
+Flat representation of a (cleaned) structure.
+
+coords, atom_names and res_index have one entry per heavy atom; res_index
+points into the residues table (chain, resnum, icode, resname).
+"""
+
+bin_names = [
+    "AA",
+    "PP",
+    "CC",
+    "AP",
+    "CP",
+    "AC",
+    "ALA",
+    "CYS",
+    "GLU",
+    "ASP",
+    "GLY",
+    "PHE",
+    "ILE",
+    "HIS",
+    "LYS",
+    "MET",
+    "LEU",
+    "ASN",
+    "GLN",
+    "PRO",
+    "SER",
+    "ARG",
+    "THR",
+    "TRP",
+    "VAL",
+    "TYR",
+]
+
+# Residue names sorted for lookups; character types per residue
+aa_names = sorted(aa_properties.aa_character_ic)
+_char_types = ["A", "C", "P"]
+_aa_char = np.array(
+    [_char_types.index(aa_properties.aa_character_ic[aa]) for aa in aa_names]
+)
+
+_SPACE, _DOT, _MINUS = ord(" "), ord("."), ord("-")
+
+
+def _fixed_width(buf, starts, ends, width):
+    """
+    Gathers a set of lines from a byte buffer into a (n_lines, width)
+    array, padding short lines with spaces.
+    """
+    idx = starts[:, None] + np.arange(width)
+    inside = idx < ends[:, None]
+    lines = np.full(idx.shape, _SPACE, dtype="u1")
+    lines[inside] = buf[idx[inside]]
+    lines[lines == ord("\r")] = _SPACE
+    return lines
+
+
+def _parse_number(chars, decimals=True):
+    """
+    Parses fixed-width numeric columns, (n, width) uint8, into floats.
+    Blank fields are read as zero.
+    """
+    is_digit = (chars >= ord("0")) & (chars <= ord("9"))
+    value = np.zeros(len(chars))
+    for col in range(chars.shape[1]):
+        digit = is_digit[:, col]
+        value[digit] = value[digit] * 10 + (chars[digit, col] - ord("0"))
+    if decimals:
+        after_dot = np.cumsum(chars == _DOT, axis=1) > 0
+        value /= 10.0 ** np.count_nonzero(is_digit & after_dot, axis=1)
+    value[np.any(chars == _MINUS, axis=1)] *= -1
+    return value
+
+
+def _as_key(chars):
+    """
+    Packs up to 8 bytes per row into a single integer for fast grouping.
+    """
+    packed = np.zeros((len(chars), 8), dtype="u1")
+    packed[:, : chars.shape[1]] = chars
+    return packed.view("<u8").ravel()
+
+
+def _guess_hydrogen(fullname):
+    """
+    Biopython's element guess from a (4 character) atom name, reduced to
+    whether the atom is a hydrogen.
+    """
+    name = fullname.strip()
+    if fullname[0].isalpha() and not fullname[2:].isdigit():
+        return name == "H"
+    if name[0].isdigit():
+        return name[1:2] == "H"
+    return name[0] == "H"
+
+
+def _record_type(record):
+    """
+    Integer key of a PDB record name, see _as_key.
+    """
+    return _as_key(np.frombuffer(record.ljust(6).encode(), dtype="u1")[None])[0]
+
+
+def _read_records(path):
+    """
+    Reads a PDB file into a byte buffer. Returns the buffer, the start and
+    end offsets of every line and the key of their record type.
+    """
+    with open(path, "rb") as handle:
+        buf = np.frombuffer(handle.read(), dtype="u1")
+
+    ends = np.flatnonzero(buf == ord("\n"))
+    if not len(ends) or ends[-1] != len(buf) - 1:
+        ends = np.append(ends, len(buf))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    record = _as_key(_fixed_width(buf, starts, ends, 6))
+    return buf, starts, ends, record
+
+
+def read_pdb(path):
+    """
+    Reads the heavy atoms of the first model of a PDB file into arrays.
+
+    Applies the same cleaning as parse_structure: HETATM records are
+    dropped, alternate locations are reduced to the highest occupancy one
+    (for point mutations, to the residue named last, as Biopython does) and
+    hydrogens are removed.
+    """
+    fname = os.path.basename(str(path))
+    buf, starts, ends, record = _read_records(path)
+
+    endmdl = np.flatnonzero(record == _record_type("ENDMDL"))
+    is_atom = record == _record_type("ATOM")
+    if len(endmdl):
+        is_atom[endmdl[0] :] = False
+
+    lines = _fixed_width(buf, starts[is_atom], ends[is_atom], 80)
+    return _atom_arrays(".".join(fname.split(".")[:-1]), lines)
+
+
+def read_pdb_models(path):
+    """
+    Iterates over the models of a (multi-model) PDB file, yielding the
+    arrays of each of them, as read_pdb does for the first one. Models are
+    named after the file and their (1-based) position.
+    """
+    fname = os.path.basename(str(path))
+    name = ".".join(fname.split(".")[:-1])
+    buf, starts, ends, record = _read_records(path)
+
+    model = np.flatnonzero(record == _record_type("MODEL"))
+    if not len(model):
+        yield read_pdb(path)
+        return
+
+    endmdl = np.flatnonzero(record == _record_type("ENDMDL"))
+    is_atom = record == _record_type("ATOM")
+    bounds = np.append(model, len(record))
+    for i_model, (first, last) in enumerate(zip(bounds[:-1], bounds[1:])):
+        closing = endmdl[(endmdl > first) & (endmdl < last)]
+        if len(closing):
+            last = closing[0]
+        in_model = np.flatnonzero(is_atom[first:last]) + first
+        lines = _fixed_width(buf, starts[in_model], ends[in_model], 80)
+        yield _atom_arrays("{0}_{1}".format(name, i_model + 1), lines)
+
+
+def _atom_arrays(name, lines):
+    """
+    Builds the arrays of a structure from its ATOM records, (n, 80) uint8.
+    """
+    resnames = np.unique(lines[:, 17:20].copy().view("S3").ravel())
+    for resname in resnames:
+        resname = resname.decode()
+        if resname not in aa_properties.aa_character_ic:
+            raise ValueError(
+                "Unsupported non-standard amino acid found: {0}".format(resname)
+            )
+
+    # Residues: (chain, resseq, icode) in order of appearance
+    res_key = _as_key(lines[:, 21:27])
+    _, first, inverse = np.unique(res_key, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    res_index = rank[inverse.ravel()]
+    first = first[order]
+
+    # Point mutations (alternate residue names): as Biopython, keep the
+    # residue named in the last record of each position
+    last = np.zeros(len(first), dtype="i8")
+    np.maximum.at(last, res_index, np.arange(len(lines)))
+    res_name = _as_key(lines[:, 17:20])
+    selected = np.flatnonzero(res_name == res_name[last[res_index]])
+
+    # Alternate locations: keep the first atom with the highest occupancy
+    occupancy = _parse_number(lines[:, 54:60])
+    atom_key = res_index.astype("u8") << np.uint64(32) | _as_key(lines[:, 12:16])
+    keep = selected[np.lexsort((selected, -occupancy[selected], atom_key[selected]))]
+    is_first = np.ones(len(keep), dtype=bool)
+    is_first[1:] = atom_key[keep][1:] != atom_key[keep][:-1]
+    keep = np.sort(keep[is_first])
+
+    # Hydrogens
+    element = lines[keep, 76:78]
+    is_h = ((element[:, 0] == _SPACE) | (element[:, 0] == ord("H"))) & (
+        element[:, 1] == ord("H")
+    )
+    is_h |= (element[:, 0] == ord("H")) & (element[:, 1] == _SPACE)
+    no_element = np.flatnonzero(np.all(element == _SPACE, axis=1))
+    if len(no_element):
+        fullnames = lines[keep[no_element], 12:16].copy().view("S4").ravel()
+        is_h[no_element] = [_guess_hydrogen(x.decode()) for x in fullnames]
+    keep = keep[~is_h]
+
+    coords = np.stack([_parse_number(lines[keep, c : c + 8]) for c in (30, 38, 46)])
+    residues = np.empty(len(first), dtype=residue_dtype)
+    residues["chain"] = lines[first, 21:22].copy().view("S1").ravel().astype("U1")
+    residues["resnum"] = _parse_number(lines[first, 22:26], decimals=False)
+    residues["icode"] = np.char.strip(
+        lines[first, 26:27].copy().view("S1").ravel().astype("U1")
+    )
+    residues["resname"] = lines[last, 17:20].copy().view("S3").ravel().astype("U3")
+    atom_names = np.char.strip(
+        lines[keep, 12:16].copy().view("S4").ravel().astype("U4")
+    )
+
+    # Match Biopython's single precision coordinates
+    return AtomArrays(
+        name=name,
+        coords=coords.T.astype("f4").astype("f8"),
+        atom_names=atom_names,
+        res_index=res_index[keep].astype("i4"),
+        residues=residues,
+    )
+
+
+def structure_arrays(structure):
+    """
+    Converts a (parsed) Biopython structure into arrays. Only the first
+    model is considered.
+    """
+    model = structure[0] if structure.level == "S" else structure
+    res_list = [r for r in model.get_residues() if len(r)]
+    atom_list = [a for r in res_list for a in r]
+
+    residues = np.empty(len(res_list), dtype=residue_dtype)
+    residues["chain"] = [r.parent.id for r in res_list]
+    residues["resnum"] = [r.id[1] for r in res_list]
+    residues["icode"] = [r.id[2].strip() for r in res_list]
+    residues["resname"] = [r.resname for r in res_list]
+
+    return AtomArrays(
+        name=structure.id,
+        coords=np.array([a.coord for a in atom_list], dtype="f8").reshape(-1, 3),
+        atom_names=np.array([a.name for a in atom_list], dtype="U4"),
+        res_index=np.repeat(np.arange(len(res_list)), [len(r) for r in res_list]),
+        residues=residues,
+    )
+
+
+def read_structure(struct):
+    """
+    Returns the arrays of a structure given as AtomArrays, Biopython
+    structure or path. PDB files are read directly into arrays; mmCIF
+    files go through parse_structure.
+    """
+    if isinstance(struct, AtomArrays):
+        return struct
+    if hasattr(struct, "get_atoms"):
+        return structure_arrays(struct)
+
+    s_ext = str(struct).split(".")[-1]
+    if s_ext in ("pdb", "ent"):
+        return read_pdb(struct)
+
+    from prodigy_cryst.modules.parsers import parse_structure
+
+    structure, _, _ = parse_structure(str(struct))
+    return structure_arrays(structure)
+
+
+def residue_centroids(arrays, backbone=("N", "CA", "C", "O", "OXT")):
+    """
+    Side-chain centroid of every residue. Residues without side-chain atoms
+    (glycines, truncated residues) use their CA, or else the mean of all
+    their atoms.
+    """
+    n_res = len(arrays.residues)
+    sidechain = ~np.isin(arrays.atom_names, backbone)
+
+    def _mean(mask):
+        total = np.zeros((n_res, 3))
+        count = np.bincount(arrays.res_index[mask], minlength=n_res)
+        np.add.at(total, arrays.res_index[mask], arrays.coords[mask])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return total / count[:, None], count > 0
+
+    centroids, _ = _mean(np.ones(len(arrays.coords), dtype=bool))
+    for mask in (arrays.atom_names == "CA", sidechain):
+        points, has_points = _mean(mask)
+        centroids[has_points] = points[has_points]
+    return centroids
+
+
+def reduced_arrays(arrays):
+    """
+    One pseudo-atom per residue, placed at its side-chain centroid.
+    Residues without atoms are left out.
+    """
+    centroids = residue_centroids(arrays)
+    has_atoms = ~np.isnan(centroids).any(axis=1)
+    return AtomArrays(
+        name=arrays.name,
+        coords=centroids[has_atoms],
+        atom_names=np.full(np.count_nonzero(has_atoms), "SC", dtype="U4"),
+        res_index=np.flatnonzero(has_atoms).astype("i4"),
+        residues=arrays.residues,
+    )
+
+
+def chain_groups(residues, selection_dict):
+    """
+    Maps every residue to its selection group (-1 if not selected).
+    """
+    groups = np.full(len(residues), -1, dtype="i4")
+    for chain, igroup in selection_dict.items():
+        groups[residues["chain"] == chain] = igroup
+    return groups
+
+
+def _box_filter(coords, idx, other, cutoff):
+    """
+    Keeps the atoms of idx that lie in the bounding box of other, grown by
+    cutoff.
+    """
+    lower = coords[other].min(axis=0) - cutoff
+    upper = coords[other].max(axis=0) + cutoff
+    xyz = coords[idx]
+    return idx[np.all((xyz >= lower) & (xyz <= upper), axis=1)]
+
+
+def atom_contacts(coords_a, coords_b, cutoff, block=1 << 20):
+    """
+    Returns the indices (i, j) of all atom pairs of two coordinate sets
+    within cutoff of each other. Distances are computed in blocks of about
+    block pairs.
+    """
+    if not len(coords_a) or not len(coords_b):
+        return np.empty(0, dtype="i8"), np.empty(0, dtype="i8")
+
+    step = max(1, block // len(coords_b))
+    cutoff_sq = cutoff * cutoff
+    hits_a, hits_b = [], []
+    for start in range(0, len(coords_a), step):
+        diff = coords_a[start : start + step, None, :] - coords_b[None, :, :]
+        d2 = np.einsum("ijk,ijk->ij", diff, diff)
+        i, j = np.nonzero(d2 <= cutoff_sq)
+        hits_a.append(i + start)
+        hits_b.append(j)
+    return np.concatenate(hits_a), np.concatenate(hits_b)
+
+
+class AtomGrid:
+    """
+    Persistent spatial index: atoms are hashed into cubic cells of side
+    cell, so that the neighbours of any set of points can be found by only
+    looking at the surrounding cells. Queries are fully vectorized.
+    """
+
+    def __init__(self, coords, cell=5.0):
+        self.coords = np.asarray(coords, dtype="f8")
+        self.cell = cell
+        cells = np.floor(self.coords / cell).astype("i8")
+        if len(cells):
+            self.origin = cells.min(axis=0)
+            self.dims = cells.max(axis=0) - self.origin + 1
+        else:
+            self.origin = np.zeros(3, dtype="i8")
+            self.dims = np.ones(3, dtype="i8")
+        keys = self._keys(cells - self.origin)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def _keys(self, cells):
+        return (cells[:, 0] * self.dims[1] + cells[:, 1]) * self.dims[2] + cells[:, 2]
+
+    def query(self, points, radius):
+        """
+        Returns the indices (i_point, i_atom) of all pairs of points and
+        indexed atoms within radius of each other.
+        """
+        points = np.asarray(points, dtype="f8")
+        span = int(np.ceil(radius / self.cell))
+        steps = np.arange(-span, span + 1)
+        offsets = np.stack(np.meshgrid(steps, steps, steps), axis=-1).reshape(-1, 3)
+
+        cells = np.floor(points / self.cell).astype("i8") - self.origin
+        neighbours = cells[:, None, :] + offsets[None, :, :]
+        inside = np.all((neighbours >= 0) & (neighbours < self.dims), axis=2)
+        i_point = np.nonzero(inside)[0]
+        keys = self._keys(neighbours[inside])
+
+        # Every neighbour cell is a contiguous range of the sorted keys
+        first = np.searchsorted(self.keys, keys, side="left")
+        counts = np.searchsorted(self.keys, keys, side="right") - first
+        i_point = np.repeat(i_point, counts)
+        shift = np.repeat(first - np.cumsum(counts) + counts, counts)
+        i_atom = self.order[np.arange(counts.sum()) + shift]
+
+        diff = points[i_point] - self.coords[i_atom]
+        close = np.einsum("ij,ij->i", diff, diff) <= radius * radius
+        return i_point[close], i_atom[close]
+
+
+def pair_distances(arrays, pairs, block=1 << 20):
+    """
+    Smallest squared atom-atom distance of each residue pair (inf for
+    residues without atoms). Atom pairs are processed in blocks of about
+    block pairs.
+    """
+    counts = np.bincount(arrays.res_index, minlength=len(arrays.residues))
+    starts = np.cumsum(counts) - counts
+    order = np.argsort(arrays.res_index, kind="stable")
+    n_atoms = counts[pairs[:, 0]] * counts[pairs[:, 1]]
+    total = np.cumsum(n_atoms)
+
+    d2_min = np.full(len(pairs), np.inf)
+    start = 0
+    while start < len(pairs):
+        offset = total[start] - n_atoms[start]
+        stop = max(start + 1, int(np.searchsorted(total, offset + block, "right")))
+        sub, n_sub = pairs[start:stop], n_atoms[start:stop]
+        first = np.cumsum(n_sub) - n_sub
+        i_pair = np.repeat(np.arange(len(sub)), n_sub)
+        k = np.arange(n_sub.sum()) - first[i_pair]
+        n_col = counts[sub[i_pair, 1]]
+        atom_1 = order[starts[sub[i_pair, 0]] + k // n_col]
+        atom_2 = order[starts[sub[i_pair, 1]] + k % n_col]
+        diff = arrays.coords[atom_1] - arrays.coords[atom_2]
+        d2 = np.einsum("ij,ij->i", diff, diff)
+        has_atoms = n_sub > 0
+        if np.any(has_atoms):
+            d2_min[start:stop][has_atoms] = np.minimum.reduceat(d2, first[has_atoms])
+        start = stop
+    return d2_min
+
+
+def orient_pairs(pairs, residues):
+    """
+    Sorts each residue pair so that the residue with the lowest chain
+    identifier comes first, as Biopython's NeighborSearch does, and
+    returns the unique pairs.
+    """
+    if not len(pairs):
+        return np.empty((0, 2), dtype="i8")
+    _, chain_rank = np.unique(residues["chain"], return_inverse=True)
+    chain_rank = chain_rank.ravel()
+    swap = chain_rank[pairs[:, 0]] > chain_rank[pairs[:, 1]]
+    pairs = np.where(swap[:, None], pairs[:, ::-1], pairs)
+    codes = np.unique(pairs[:, 0] * len(residues) + pairs[:, 1])
+    return np.stack(np.divmod(codes, len(residues)), axis=1)
+
+
+def find_contacts(arrays, selection_dict, cutoff=5.0):
+    """
+    Finds the residue pairs in contact between different selection groups.
+
+    Returns a (n_contacts, 2) array of indices into arrays.residues.
+    """
+    groups = chain_groups(arrays.residues, selection_dict)[arrays.res_index]
+    coords = arrays.coords
+
+    pairs = []
+    for g1, g2 in combinations(np.unique(groups[groups >= 0]), 2):
+        idx_1 = np.flatnonzero(groups == g1)
+        idx_2 = np.flatnonzero(groups == g2)
+        idx_1, idx_2 = (
+            _box_filter(coords, idx_1, idx_2, cutoff),
+            _box_filter(coords, idx_2, idx_1, cutoff),
+        )
+        if not len(idx_1) or not len(idx_2):
+            continue
+        hit_1, hit_2 = atom_contacts(coords[idx_1], coords[idx_2], cutoff)
+        pairs.append(
+            np.stack(
+                [arrays.res_index[idx_1[hit_1]], arrays.res_index[idx_2[hit_2]]],
+                axis=1,
+            )
+        )
+
+    if not pairs:
+        return np.empty((0, 2), dtype="i8")
+    return orient_pairs(np.concatenate(pairs), arrays.residues)
+
+
+def residue_codes(residues):
+    """
+    Index of each residue name in aa_names.
+    """
+    return np.searchsorted(aa_names, residues["resname"])
+
+
+def bin_contacts(pairs, residues):
+    """
+    Array version of analyse_contacts: counts contacts per pair of residue
+    character types and per residue name.
+    """
+    bins = dict.fromkeys(bin_names, 0)
+    codes = residue_codes(residues)[pairs]
+    chars = np.sort(_aa_char[codes], axis=1)
+
+    char_counts = np.bincount(chars[:, 0] * 3 + chars[:, 1], minlength=9)
+    for i_1, i_2 in combinations(range(3), 2):
+        pair_type = "".join(sorted(_char_types[i_1] + _char_types[i_2]))
+        bins[pair_type] = int(char_counts[i_1 * 3 + i_2])
+    for i_char, char in enumerate(_char_types):
+        bins[char + char] = int(char_counts[i_char * 4])
+
+    aa_counts = np.bincount(codes.ravel(), minlength=len(aa_names))
+    for aa, count in zip(aa_names, aa_counts):
+        bins[aa] = int(count)
+    return bins
+
+
+def link_density(pairs):
+    """
+    Fraction of possible residue pairs across the interface that are in
+    contact.
+    """
+    max_contacts = len(np.unique(pairs[:, 0])) * len(np.unique(pairs[:, 1]))
+    return len(pairs) / max_contacts
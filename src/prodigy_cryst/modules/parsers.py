@@ -14,14 +14,55 @@ from __future__ import division, print_function
 import logging
 import os
 
+import numpy as np
+
 try:
     from Bio.PDB import MMCIFParser, PDBParser
-    from Bio.PDB.Polypeptide import PPBuilder, is_aa
+    from Bio.PDB.Polypeptide import is_aa
 except ImportError as e:
     logging.error("[!] The interface classifier tool requires Biopython")
     raise ImportError(e)
 
 
+def detect_gaps(model, bond_cutoff=1.8):
+    """
+    Splits each chain of a model into continuous fragments.
+
+    Two consecutive residues are connected if the C atom of the first lies
+    within bond_cutoff of the N atom of the second, the same criterion used
+    by Biopython's PPBuilder. All C-N distances of a chain are computed in a
+    single array operation. Returns a list of (first, last) residue tuples;
+    as with PPBuilder, isolated residues do not form a fragment.
+    """
+    fragments = []
+    for chain in model:
+        residues = chain.child_list
+        if len(residues) < 2:
+            continue
+
+        c_xyz = np.full((len(residues), 3), np.nan)
+        n_xyz = np.full((len(residues), 3), np.nan)
+        for i_res, res in enumerate(residues):
+            if "C" in res.child_dict:
+                c_xyz[i_res] = res.child_dict["C"].coord
+            if "N" in res.child_dict:
+                n_xyz[i_res] = res.child_dict["N"].coord
+
+        # Missing atoms give NaN distances, which are never connected
+        bond_d = np.linalg.norm(c_xyz[:-1] - n_xyz[1:], axis=1)
+        with np.errstate(invalid="ignore"):
+            broken = ~(bond_d < bond_cutoff)
+
+        # Link i joins residues i and i + 1: fragments are runs of links
+        # between broken ones.
+        edges = np.concatenate(([-1], np.flatnonzero(broken), [len(bond_d)]))
+        for start, end in zip(edges[:-1] + 1, edges[1:]):
+            if end > start:
+                fragments.append((residues[start], residues[end]))
+
+    return fragments
+
+
 def parse_structure(path):
     """
     Parses a structure using Biopython's PDB/mmCIF Parser
@@ -102,17 +143,16 @@ def parse_structure(path):
             residue.detach_child(atom.name)
 
     # Detect gaps and compare with no. of chains
-    pep_builder = PPBuilder()
-    peptides = pep_builder.build_peptides(s)
-    n_peptides = len(peptides)
+    fragments = detect_gaps(s[0])
+    n_fragments = len(fragments)
     n_chains = len(set([c.id for c in s.get_chains()]))
 
-    if n_peptides != n_chains:
+    if n_fragments != n_chains:
         log.warning("[!] Structure contains gaps:")
-        for i_pp, pp in enumerate(peptides):
+        for i_pp, (first, last) in enumerate(fragments):
             log.warning(
                 "\t{1.parent.id} {1.resname}{1.id[1]} < Fragment {0} > {2.parent.id} {2.resname}{2.id[1]}".format(
-                    i_pp, pp[0], pp[-1]
+                    i_pp, first, last
                 )
             )
         # raise Exception('Calculation cannot proceed')
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+#
+# This code is part of the interface classifier tool distribution
+# and governed by its license.  Please see the LICENSE file that should
+# have been included as part of this package.
+#
+
+"""
+Streaming, columnar output of classification results (CSV, TSV or JSONL).
+"""
+
+from __future__ import division, print_function
+
+import csv
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+formats = {"csv": ",", "tsv": "\t", "jsonl": None}
+
+
+def flatten_result(result, timings=None):
+    """
+    One output row from a result (anything with an as_dict method, or a
+    dictionary with the same fields). The predicted class is split into
+    class and probabilities and timings are added as time_<name> columns.
+    """
+    values = result.as_dict() if hasattr(result, "as_dict") else dict(result)
+    row = {
+        "structure": values.pop("structure"),
+        "selection": " ".join(values.pop("selection")),
+    }
+    predicted = values.pop("predicted_class", None) or (None, None, None)
+    row["ICs"] = values.pop("ICs")
+    row["link_density"] = values.pop("link_density")
+    row["class"], row["p_bio"], row["p_xtal"] = predicted
+    row.update(values)
+    for name, value in (timings or {}).items():
+        row["time_" + name] = value
+    return row
+
+
+def _row_key(row):
+    return "{0}\t{1}".format(row["structure"], row["selection"])
+
+
+def _gunzip(data):
+    """
+    Decompresses all the gzip members of data. Returns the decompressed
+    data and whether the last member was complete (e.g. not truncated by
+    an interrupted run).
+    """
+    chunks = []
+    while data:
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            chunks.append(inflater.decompress(data))
+        except zlib.error:
+            return b"".join(chunks), False
+        if not inflater.eof:
+            chunks.append(inflater.flush())
+            return b"".join(chunks), False
+        data = inflater.unused_data
+    return b"".join(chunks), True
+
+
+def _drop_partial_row(path, block=1 << 16):
+    """
+    Truncates an uncompressed file after its last newline, reading only
+    its end.
+    """
+    with open(path, "r+b") as handle:
+        end = handle.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            start = max(0, pos - block)
+            handle.seek(start)
+            newline = handle.read(pos - start).rfind(b"\n")
+            if newline >= 0:
+                pos = start + newline + 1
+                break
+            pos = start
+        if pos < end:
+            logging.warning("[!] Removing a partial row at the end of {0}".format(path))
+            handle.truncate(pos)
+
+
+class ResultWriter:
+    """
+    Writes one row per result to a CSV, TSV or JSONL file.
+
+    The format and compression are taken from the file extension (e.g.
+    results.tsv.gz) unless given. Rows go through a large write buffer. In
+    append mode, rows are added to an existing file, reusing its columns
+    (other columns are not written), and a partial last row left by an
+    interrupted run is removed first. With resume=True, the rows already
+    present are recorded in self.done so that a batch can be resumed; this
+    reads the whole file. Otherwise only its header and end are read, but
+    compressed files are not checked for a partial last row.
+
+    Appending holds an exclusive lock on the file (where fcntl is
+    available) until the writer is closed, so that several processes can
+    append to the same file. QueueWriter is the way to share one writer
+    between processes.
+    """
+
+    def __init__(
+        self,
+        path,
+        fmt=None,
+        compress=None,
+        append=False,
+        resume=True,
+        buffer_size=1 << 20,
+    ):
+        path = str(path)
+        exts = os.path.basename(path).split(".")[1:]
+        if compress is None:
+            compress = bool(exts) and exts[-1] == "gz"
+        if fmt is None:
+            exts = [x for x in exts if x != "gz"]
+            fmt = exts[-1] if exts else "csv"
+        if fmt not in formats:
+            raise ValueError(
+                "[!] Output format '{0}' is not supported. Use {1}.".format(
+                    fmt, ", ".join(sorted(formats))
+                )
+            )
+
+        self.path = path
+        self.fmt = fmt
+        self.compress = compress
+        self.fields = None
+        self.done = set()
+
+        self._lock = None
+        if append:
+            self._lock = open(path, "ab")
+            if fcntl is not None:
+                fcntl.flock(self._lock, fcntl.LOCK_EX)
+            if os.path.getsize(path):
+                if resume:
+                    self._read_existing()
+                else:
+                    self._read_header()
+
+        mode = "at" if append else "wt"
+        if compress:
+            self.handle = gzip.open(path, mode, newline="")
+        else:
+            self.handle = open(path, mode, newline="", buffering=buffer_size)
+
+        self._csv = None
+        if self.fmt != "jsonl" and self.fields:
+            self._csv = csv.DictWriter(
+                self.handle,
+                self.fields,
+                delimiter=formats[self.fmt],
+                extrasaction="ignore",
+            )
+        self._ignored = set()
+
+    def _read_header(self):
+        if not self.compress:
+            _drop_partial_row(self.path)
+        if self.fmt == "jsonl":
+            return
+        try:
+            if self.compress:
+                with gzip.open(self.path, "rt", newline="") as handle:
+                    header = handle.readline()
+            else:
+                with open(self.path, newline="") as handle:
+                    header = handle.readline()
+        except (EOFError, OSError):
+            return
+        if header.endswith("\n"):
+            self.fields = next(csv.reader([header], delimiter=formats[self.fmt]))
+
+    def _read_existing(self):
+        with open(self.path, "rb") as handle:
+            data = handle.read()
+        complete = True
+        if self.compress:
+            data, complete = _gunzip(data)
+
+        # Drop a partial last row
+        end = data.rfind(b"\n") + 1
+        if end < len(data) or not complete:
+            logging.warning(
+                "[!] Removing a partial row at the end of {0}".format(self.path)
+            )
+            if self.compress:
+                with gzip.open(self.path, "wb") as handle:
+                    handle.write(data[:end])
+            else:
+                with open(self.path, "r+b") as handle:
+                    handle.truncate(end)
+
+        lines = data[:end].decode().splitlines()
+        if self.fmt == "jsonl":
+            for line in lines:
+                if line.strip():
+                    self.done.add(_row_key(json.loads(line)))
+        else:
+            reader = csv.DictReader(lines, delimiter=formats[self.fmt])
+            self.fields = reader.fieldnames
+            for row in reader:
+                self.done.add(_row_key(row))
+
+    def write_row(self, row):
+        """
+        Writes an already flattened row (see flatten_result).
+        """
+        if self.fmt == "jsonl":
+            self.handle.write(json.dumps(row) + "\n")
+        else:
+            if self._csv is None:
+                self.fields = list(row)
+                self._csv = csv.DictWriter(
+                    self.handle, self.fields, delimiter=formats[self.fmt]
+                )
+                self._csv.writeheader()
+            ignored = set(row).difference(self.fields, self._ignored)
+            if ignored:
+                logging.warning(
+                    "[!] Columns not in {0} are not written: {1}".format(
+                        self.path, ", ".join(sorted(ignored))
+                    )
+                )
+                self._ignored.update(ignored)
+            self._csv.writerow(row)
+        self.done.add(_row_key(row))
+
+    def write(self, result, timings=None):
+        """
+        Writes a result, with optional timings (name -> seconds).
+        """
+        self.write_row(flatten_result(result, timings))
+
+    def close(self):
+        self.handle.close()
+        if self._lock is not None:
+            self._lock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class QueueWriter:
+    """
+    Single writer fed by several processes through a queue.
+
+    The rows put in self.queue (by this or any worker process that has
+    received the queue, e.g. through a pool initializer) are written by a
+    background thread of the owning process. An error while writing stops
+    the writing and is raised by close().
+    """
+
+    def __init__(self, path, **kwargs):
+        self.writer = ResultWriter(path, **kwargs)
+        self.queue = multiprocessing.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        for row in iter(self.queue.get, None):
+            if self._error is not None:
+                continue
+            try:
+                self.writer.write_row(row)
+            except Exception as e:
+                self._error = e
+
+    def put(self, result, timings=None):
+        self.queue.put(flatten_result(result, timings))
+
+    @property
+    def done(self):
+        return self.writer.done
+
+    def close(self):
+        self.queue.put(None)
+        self._thread.join()
+        self.writer.close()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+#
+# This code is part of the interface classifier tool distribution
+# and governed by its license.  Please see the LICENSE file that should
+# have been included as part of this package.
+#
+
+"""
+Fast approximate screening of interfaces.
+
+Contacts are first searched between side-chain centroids, one point per
+residue, with a cutoff calibrated to reproduce the number of heavy atom
+contacts. Only interfaces whose predicted probability lands close to the
+decision boundary are re-classified with the full-atom contacts.
+"""
+
+from __future__ import division, print_function
+
+from itertools import islice
+
+import numpy as np
+
+from prodigy_cryst.interface_classifier import (
+    ClassificationResult,
+    feature_bins,
+    feature_vector,
+    interface_features,
+    predict_features,
+)
+from prodigy_cryst.modules import kernels
+
+# Side-chain centroid cutoff whose features best match the 5.0A heavy atom
+# features. Obtained with calibrate_cutoff on the two structures of the test
+# data (prodigy_cryst_calibrate tests/golden_data/*.pdb), i.e. not on a
+# representative set: recalibrate on your own structures with
+# prodigy_cryst_calibrate and pass the result as cutoff.
+APPROX_CUTOFF = 7.7
+
+
+def approximate_features(struct, selection=None, cutoff=APPROX_CUTOFF):
+    """
+    Same as interface_features, computed from side-chain centroids.
+    """
+    arrays = kernels.read_structure(struct)
+    return interface_features(
+        kernels.reduced_arrays(arrays), selection=selection, d_cutoff=cutoff
+    )
+
+
+def _feature_error(approx, exact):
+    """
+    Distance between approximate and exact classifier features: absolute
+    bin differences relative to the number of exact contacts, plus the
+    relative link density difference.
+    """
+    a_bins, a_ld = (approx[3], approx[4]) if approx is not None else ({}, 0.0)
+    _, _, contacts, e_bins, e_ld = exact
+    bin_error = sum(abs(a_bins.get(b, 0) - e_bins[b]) for b in feature_bins)
+    return bin_error / len(contacts) + abs(a_ld - e_ld) / e_ld
+
+
+def calibrate_cutoff(structs, selection=None, d_cutoff=5.0, cutoffs=None):
+    """
+    Picks the centroid cutoff whose features (bins and link density) best
+    match the heavy atom features over a set of structures, summing the
+    error of each structure (see _feature_error).
+    """
+    if cutoffs is None:
+        cutoffs = np.round(np.arange(6.0, 10.05, 0.1), 1)
+
+    errors = np.zeros(len(cutoffs))
+    for struct in structs:
+        arrays = kernels.read_structure(struct)
+        exact = interface_features(arrays, selection=selection, d_cutoff=d_cutoff)
+        for i_cut, cutoff in enumerate(cutoffs):
+            try:
+                approx = approximate_features(
+                    arrays, selection=selection, cutoff=cutoff
+                )
+            except ValueError:
+                approx = None
+            errors[i_cut] += _feature_error(approx, exact)
+
+    return float(cutoffs[np.argmin(errors)])
+
+
+def _exact_features(arrays, selection, d_cutoff):
+    """
+    Full-atom features, or None if the interface has no contacts.
+    """
+    try:
+        return interface_features(arrays, selection=selection, d_cutoff=d_cutoff)
+    except ValueError:
+        return None
+
+
+def _screen_chunk(arrays_list, selection, band, cutoff, d_cutoff, compare):
+    """
+    Screens a list of structures. Returns the results, the number of
+    fallbacks and the number of approximate calls agreeing with the exact
+    ones (if compare).
+    """
+    approx = []
+    for arrays in arrays_list:
+        try:
+            approx.append(
+                approximate_features(arrays, selection=selection, cutoff=cutoff)
+            )
+        except ValueError:
+            approx.append(None)
+
+    scored = [a for a in approx if a is not None]
+    predictions = iter(
+        predict_features([feature_vector(a[3], a[4]) for a in scored]) if scored else []
+    )
+    approx_predictions = [next(predictions) if a is not None else None for a in approx]
+
+    fallbacks = set(
+        i_struct
+        for i_struct, prediction in enumerate(approx_predictions)
+        if prediction is None or band >= 0.5 or abs(prediction[1] - 0.5) < band
+    )
+    exact_ids = sorted(fallbacks) if not compare else range(len(arrays_list))
+    exact_features = dict(
+        (i, _exact_features(arrays_list[i], selection, d_cutoff)) for i in exact_ids
+    )
+    with_contacts = [i for i in exact_ids if exact_features[i] is not None]
+    exact_predictions = dict(
+        zip(
+            with_contacts,
+            predict_features(
+                [feature_vector(*exact_features[i][3:]) for i in with_contacts]
+            )
+            if with_contacts
+            else [],
+        )
+    )
+
+    results = []
+    n_agree = 0
+    for i_struct, arrays in enumerate(arrays_list):
+        if compare:
+            approx_class = (approx_predictions[i_struct] or (None,))[0]
+            exact_class = (exact_predictions.get(i_struct) or (None,))[0]
+            n_agree += approx_class == exact_class
+
+        if i_struct not in fallbacks:
+            _, sel, contacts, bins, ld = approx[i_struct]
+            prediction = approx_predictions[i_struct]
+        elif exact_features[i_struct] is not None:
+            _, sel, contacts, bins, ld = exact_features[i_struct]
+            prediction = exact_predictions[i_struct]
+        else:
+            chains = list(dict.fromkeys(arrays.residues["chain"].tolist()))
+            sel = selection or chains
+            contacts = np.empty((0, 2), dtype="i8")
+            bins, ld = dict.fromkeys(kernels.bin_names, 0), 0.0
+            prediction = None
+
+        results.append(
+            ClassificationResult(
+                structure=arrays.name,
+                selection=tuple(sel),
+                contacts=contacts,
+                residues=arrays.residues,
+                bins=bins,
+                link_density=ld,
+                predicted_class=prediction,
+                approximate=i_struct not in fallbacks,
+            )
+        )
+    return results, len(fallbacks), n_agree
+
+
+def screen(
+    structs,
+    selection=None,
+    band=0.15,
+    cutoff=APPROX_CUTOFF,
+    d_cutoff=5.0,
+    compare=False,
+    chunk_size=1024,
+):
+    """
+    Classifies a batch of structures with the approximate contacts.
+
+    Interfaces with a BIO probability strictly within band of 0.5 (or
+    without any approximate contact) are re-classified with the full-atom
+    contacts; with a band of 0.5 or more, all of them are. Interfaces
+    without any contact at all have a predicted_class of None.
+    structs are read and classified in chunks of chunk_size. Returns the
+    list of ClassificationResult and a report with the number of
+    interfaces and fallbacks. With compare=True, all interfaces are also
+    classified exactly and the report includes how often the approximate
+    call agrees with the exact one.
+    """
+    structs = iter(structs)
+    results = []
+    n_fallback = n_agree = 0
+    while True:
+        chunk = [kernels.read_structure(s) for s in islice(structs, chunk_size)]
+        if not chunk:
+            break
+        chunk_results, chunk_fallback, chunk_agree = _screen_chunk(
+            chunk, selection, band, cutoff, d_cutoff, compare
+        )
+        results.extend(chunk_results)
+        n_fallback += chunk_fallback
+        n_agree += chunk_agree
+
+    n_total = len(results)
+    report = {
+        "interfaces": n_total,
+        "fallbacks": n_fallback,
+        "fallback_rate": n_fallback / n_total if n_total else 0.0,
+    }
+    if compare:
+        report["agreement"] = n_agree / n_total if n_total else 1.0
+    return results, report
+
+
+def main():
+
+    import argparse
+
+    ap = argparse.ArgumentParser(
+        description="Calibrates the side-chain centroid cutoff of the screening"
+    )
+    ap.add_argument("structures", nargs="+", help="Structures in PDB or mmCIF format")
+    ap.add_argument("--selection", nargs="+", metavar=("A B", "A,B C"))
+    ap.add_argument("--d-cutoff", type=float, default=5.0, help="Full-atom cutoff")
+    cmd = ap.parse_args()
+
+    cutoff = calibrate_cutoff(
+        cmd.structures, selection=cmd.selection, d_cutoff=cmd.d_cutoff
+    )
+    print("{0:.1f}".format(cutoff))
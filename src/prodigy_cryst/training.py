@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+#
+# This code is part of the interface classifier tool distribution
+# and governed by its license.  Please see the LICENSE file that should
+# have been included as part of this package.
+#
+
+"""
+Regenerates the interface features of the training set and retrains the classifier.
+"""
+
+from __future__ import division, print_function
+
+import csv
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import StratifiedKFold, cross_val_score
+except ImportError as e:
+    logging.error("[!] Retraining the classifier requires scikit-learn")
+    raise ImportError(e)
+
+from prodigy_cryst.interface_classifier import (
+    feature_bins,
+    interface_features,
+    make_selection_dict,
+)
+from prodigy_cryst.modules import aa_properties, contact_map, kernels, parsers
+
+data_path = Path(Path(__file__).resolve().parent, "data")
+training_set = Path(data_path, "List_of_features-MANY.csv")
+
+# Column names of the feature table that differ from the bin names
+_column_names = {"AC": "CA"}
+feature_columns = [_column_names.get(x, x) for x in feature_bins] + ["LD"]
+classes = ["BIO", "XTAL"]
+
+
+def feature_version(d_cutoff=5.0):
+    """
+    Identifies the code used to compute the features, so that cached
+    features are recomputed whenever it changes: the contact and binning
+    kernels, the residue character table, the residue table layout, the
+    structure parsers and the selection handling.
+    """
+    sha = hashlib.sha1(repr(d_cutoff).encode())
+    sha.update(repr(contact_map.residue_dtype).encode())
+    for func in (interface_features, make_selection_dict):
+        sha.update(inspect.getsource(func).encode())
+    for module in (kernels, aa_properties, parsers):
+        with open(module.__file__, "rb") as handle:
+            sha.update(handle.read())
+    return sha.hexdigest()[:12]
+
+
+def load_feature_table(path=training_set):
+    """
+    Reads a feature table (such as the shipped List_of_features-MANY.csv)
+    in one go. Returns the entry identifiers, the numeric column names, the
+    numeric matrix and the class labels (0 for BIO, 1 for XTAL).
+    """
+    with open(path, newline="") as handle:
+        reader = csv.reader(handle)
+        header = next(reader)
+        rows = list(reader)
+
+    table = np.array(rows, dtype=object).reshape(-1, len(header))
+    text = set(["PDB", "CLASS"])
+    numeric = [c for c in header if c not in text]
+    matrix = table[:, [header.index(c) for c in numeric]].astype("f8")
+    labels = np.array([classes.index(x) for x in table[:, header.index("CLASS")]])
+    return table[:, header.index("PDB")].astype(str), numeric, matrix, labels
+
+
+def training_matrix(columns, matrix):
+    """
+    Selects the classifier features, in order, from a feature table.
+    """
+    return matrix[:, [columns.index(c) for c in feature_columns]]
+
+
+def _find_structure(struct_dir, entry):
+    for ext in ("pdb", "ent", "cif"):
+        path = Path(struct_dir, "{0}.{1}".format(entry, ext))
+        if path.is_file():
+            return path
+    return None
+
+
+def _entry_features(args):
+    """
+    Features of a single entry, read from the cache when up to date (same
+    feature code and same structure file size and modification time).
+    """
+    entry, struct_dir, cache_dir, version, d_cutoff = args
+    path = _find_structure(struct_dir, entry)
+    stamp = None
+    if path is not None:
+        stat = path.stat()
+        stamp = [path.name, stat.st_size, stat.st_mtime_ns]
+
+    cache_f = Path(cache_dir, "{0}.json".format(entry)) if cache_dir else None
+    if cache_f and cache_f.is_file():
+        with open(cache_f) as handle:
+            cached = json.load(handle)
+        if cached.get("version") == version and cached.get("structure") == stamp:
+            return entry, cached
+
+    result = {"version": version, "structure": stamp}
+    if path is None:
+        result["error"] = "structure not found"
+    else:
+        try:
+            _, _, contacts, bins, ld = interface_features(path, d_cutoff=d_cutoff)
+            result.update(bins)
+            result["IC"] = len(contacts)
+            result["link_density"] = ld
+        except Exception as e:
+            result["error"] = str(e)
+
+    if cache_f:
+        with open(cache_f, "w") as handle:
+            json.dump(result, handle)
+    return entry, result
+
+
+def regenerate_features(entries, struct_dir, cache_dir=None, n_jobs=None, d_cutoff=5.0):
+    """
+    Recomputes the features of a list of entries from a directory of
+    structures named after them (e.g. 1o9d_1.pdb), in parallel. With a
+    cache directory, the features of each entry are stored there and only
+    recomputed when the feature code or the structure file changes.
+
+    Returns a dictionary entry -> features (or {"error": msg}).
+    """
+    version = feature_version(d_cutoff)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    tasks = [(e, str(struct_dir), cache_dir, version, d_cutoff) for e in entries]
+    if n_jobs == 1:
+        return dict(map(_entry_features, tasks))
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return dict(executor.map(_entry_features, tasks, chunksize=16))
+
+
+def write_feature_table(features, labels, outfile):
+    """
+    Writes regenerated features in the layout of List_of_features-MANY.csv
+    (without the SASA and energy columns). labels maps entries to classes.
+    """
+    bin_columns = ["CC", "CP", "AC", "PP", "AP", "AA"] + kernels.bin_names[6:]
+    with open(outfile, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        header = ["PDB", "IC"] + [_column_names.get(x, x) for x in bin_columns[:6]]
+        writer.writerow(header + ["LD"] + bin_columns[6:] + ["CLASS"])
+        for entry, values in features.items():
+            if "error" in values:
+                continue
+            row = [entry, values["IC"]] + [values[x] for x in bin_columns[:6]]
+            row += [values["link_density"]] + [values[x] for x in bin_columns[6:]]
+            writer.writerow(row + [labels[entry]])
+
+
+def retrain(x, y, n_estimators=500, cv=5, n_jobs=-1, random_state=0):
+    """
+    Cross-validates and fits a random forest on a feature matrix, using
+    n_jobs cores. Returns the fitted model and a report with accuracies
+    and timings.
+    """
+
+    def _model():
+        return RandomForestClassifier(
+            n_estimators=n_estimators, n_jobs=n_jobs, random_state=random_state
+        )
+
+    report = {"samples": int(len(y)), "features": int(x.shape[1])}
+
+    t0 = time.time()
+    folds = StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state)
+    scores = cross_val_score(_model(), x, y, cv=folds, scoring="accuracy")
+    report["cv_accuracy"] = [float(s) for s in scores]
+    report["cv_accuracy_mean"] = float(np.mean(scores))
+    report["cv_accuracy_std"] = float(np.std(scores))
+    report["cv_time"] = time.time() - t0
+
+    t0 = time.time()
+    model = _model().fit(x, y)
+    report["fit_time"] = time.time() - t0
+    report["training_accuracy"] = float(model.score(x, y))
+    return model, report
+
+
+def main():
+
+    import argparse
+
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument(
+        "--features",
+        default=str(training_set),
+        help="Feature table with entry ids and classes (default: shipped training set)",
+    )
+    ap.add_argument(
+        "--structures",
+        help="Directory of structures named after the entries. "
+        "If given, the features are recomputed from them.",
+    )
+    ap.add_argument("--cache", help="Directory to cache the features of each entry")
+    ap.add_argument("--output", default="classifier.sav", help="New model file")
+    ap.add_argument("--report", default="training_report.json", help="Report file")
+    ap.add_argument("--table", help="Write the regenerated feature table here")
+    ap.add_argument("--n-jobs", type=int, default=-1, help="Number of cores")
+    ap.add_argument("--cv", type=int, default=5, help="Cross-validation folds")
+    ap.add_argument("--n-estimators", type=int, default=500)
+    cmd = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    log = logging.getLogger("Prodigy")
+    n_jobs = None if cmd.n_jobs < 0 else cmd.n_jobs
+
+    t0 = time.time()
+    entries, columns, matrix, labels = load_feature_table(cmd.features)
+    report = {"load_time": time.time() - t0}
+    log.info("[+] Read {0} entries from {1}".format(len(entries), cmd.features))
+
+    if cmd.structures:
+        t0 = time.time()
+        features = regenerate_features(
+            entries, cmd.structures, cache_dir=cmd.cache, n_jobs=n_jobs
+        )
+        report["feature_time"] = time.time() - t0
+        failed = set(e for e in entries if "error" in features[e])
+        report["failed_entries"] = len(failed)
+        log.info(
+            "[+] Features of {0} entries computed ({1} failed)".format(
+                len(entries), len(failed)
+            )
+        )
+
+        keep = np.array([e not in failed for e in entries], dtype=bool)
+        x = np.array(
+            [
+                [features[e][b] for b in feature_bins] + [features[e]["link_density"]]
+                for e in entries[keep]
+            ],
+            dtype="f8",
+        ).reshape(-1, len(feature_columns))
+        y = labels[keep]
+        if cmd.table:
+            class_of = dict(zip(entries, [classes[i] for i in labels]))
+            write_feature_table(
+                dict((e, features[e]) for e in entries[keep]), class_of, cmd.table
+            )
+    else:
+        x, y = training_matrix(columns, matrix), labels
+
+    model, fit_report = retrain(
+        x, y, n_estimators=cmd.n_estimators, cv=cmd.cv, n_jobs=cmd.n_jobs
+    )
+    report.update(fit_report)
+    log.info(
+        "[+] Cross-validated accuracy: {0:.3f} +/- {1:.3f}".format(
+            report["cv_accuracy_mean"], report["cv_accuracy_std"]
+        )
+    )
+
+    with open(cmd.output, "wb") as handle:
+        pickle.dump(model, handle)
+    with open(cmd.report, "w") as handle:
+        json.dump(report, handle, indent=2)
+    log.info("[+] Model written to {0}, report to {1}".format(cmd.output, cmd.report))
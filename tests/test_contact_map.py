@@ -0,0 +1,114 @@
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+import numpy as np
+import pytest
+from Bio.PDB.Chain import Chain
+
+from prodigy_cryst.interface_classifier import ProdigyCrystal, calculate_ic
+from prodigy_cryst.modules.contact_map import (
+    build_contact_map,
+    load_contact_map,
+    to_dense,
+    write_contact_map,
+)
+from prodigy_cryst.modules.parsers import parse_structure
+from tests import DATA_FOLDER
+
+
+@pytest.fixture
+def parsed_structure():
+    pdb_path = Path(DATA_FOLDER, "complex.pdb")
+    s, _, _ = parse_structure(pdb_path)
+    return s
+
+
+def test_build_contact_map(parsed_structure):
+    """Test the conversion of a contact list to a sparse map."""
+    ic_list = calculate_ic(parsed_structure)
+    contact_map = build_contact_map(ic_list, selection=["E", "I"], distances=True)
+
+    assert len(contact_map["row"]) == len(ic_list) == 71
+    assert set(contact_map["residues_a"]["chain"]) == {"E"}
+    assert set(contact_map["residues_b"]["chain"]) == {"I"}
+    n_a, n_b = contact_map["shape"]
+    residues = set(r for pair in ic_list for r in pair)
+    assert n_a == len([r for r in residues if r.parent.id == "E"])
+    assert n_b == len([r for r in residues if r.parent.id == "I"])
+    assert np.all(contact_map["distance"] <= 5.0)
+
+    # check one distance by brute force
+    res_a = parsed_structure[0]["E"][contact_map["residues_a"]["resnum"][0]]
+    res_b = parsed_structure[0]["I"][
+        contact_map["residues_b"]["resnum"][contact_map["col"][0]]
+    ]
+    expected = min(a - b for a in res_a for b in res_b)
+    assert contact_map["distance"][0] == pytest.approx(expected, abs=1e-4)
+
+
+def test_build_contact_map_groups(parsed_structure):
+    """Test the orientation of contacts with more than two groups."""
+    # Split chain E in two chains, A and E
+    model = parsed_structure[0]
+    chain_a = Chain("A")
+    model.add(chain_a)
+    for res in [r for r in model["E"] if r.id[1] < 100]:
+        model["E"].detach_child(res.id)
+        chain_a.add(res)
+    ic_list = calculate_ic(parsed_structure)
+    assert set(r.parent.id for pair in ic_list for r in pair) == {"A", "E", "I"}
+
+    contact_map = build_contact_map(ic_list)
+    group_a = contact_map["group_a"][contact_map["row"]]
+    group_b = contact_map["group_b"][contact_map["col"]]
+    assert np.all(group_a < group_b)
+    assert set(contact_map["residues_a"]["chain"]) == {"A", "E"}
+    assert set(contact_map["residues_b"]["chain"]) == {"E", "I"}
+
+    contact_map = build_contact_map(ic_list, selection=["I", "A", "E"])
+    assert set(contact_map["residues_a"]["chain"]) == {"I", "A"}
+    assert set(contact_map["residues_b"]["chain"]) == {"A", "E"}
+    assert set(contact_map["group_a"]) == {0, 1}
+
+    contact_map = build_contact_map(
+        [p for p in ic_list if "I" in (p[0].parent.id, p[1].parent.id)],
+        selection=["I", "A,E"],
+    )
+    assert set(contact_map["residues_a"]["chain"]) == {"I"}
+    assert set(contact_map["residues_b"]["chain"]) == {"A", "E"}
+
+
+def test_write_load_contact_map(parsed_structure):
+    """Test the round trip of a contact map through a .npz file."""
+    ic_list = calculate_ic(parsed_structure)
+    temp_f = NamedTemporaryFile(delete=False, suffix=".npz")
+    temp_f.close()
+
+    written = write_contact_map(ic_list, temp_f.name, selection=["E", "I"])
+    loaded = load_contact_map(temp_f.name)
+
+    assert loaded["distance"] is None
+    assert loaded["shape"] == tuple(written["shape"])
+    assert np.array_equal(loaded["row"], written["row"])
+    assert np.array_equal(loaded["residues_b"], written["residues_b"])
+    assert to_dense(loaded).sum() == 71
+
+    os.unlink(temp_f.name)
+
+
+def test_prodigycrystal_export_contacts(parsed_structure):
+    """Test the export of the interface network of a prediction."""
+    prodigyxtal = ProdigyCrystal(parsed_structure)
+    prodigyxtal.ic_network = calculate_ic(parsed_structure)
+    temp_f = NamedTemporaryFile(delete=False, suffix=".npz")
+    temp_f.close()
+
+    prodigyxtal.export_contacts(temp_f.name, distances=True)
+    loaded = load_contact_map(temp_f.name)
+    dense = to_dense(loaded)
+
+    assert loaded["distance"].dtype == np.float32
+    assert np.count_nonzero(dense) == 71
+
+    os.unlink(temp_f.name)
@@ -0,0 +1,83 @@
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pytest
+
+from prodigy_cryst.decoys import ReceptorIndex, iter_poses, score_poses
+from prodigy_cryst.interface_classifier import interface_features
+from prodigy_cryst.modules.kernels import read_pdb_models
+from tests import DATA_FOLDER
+
+
+@pytest.fixture
+def decoy_files():
+    """Receptor (chain E) and three ligand (chain I) poses of the complex."""
+    with open(Path(DATA_FOLDER, "complex.pdb")) as handle:
+        atoms = [line for line in handle if line.startswith("ATOM")]
+    receptor = [line for line in atoms if line[21] == "E"]
+    ligand = [line for line in atoms if line[21] == "I"]
+    shifted = [
+        "{0}{1:8.3f}{2}".format(line[:30], float(line[30:38]) + 100.0, line[38:])
+        for line in ligand
+    ]
+
+    with TemporaryDirectory() as tmpdir:
+        receptor_f = os.path.join(tmpdir, "receptor.pdb")
+        with open(receptor_f, "w") as handle:
+            handle.writelines(receptor)
+        poses_f = os.path.join(tmpdir, "poses.pdb")
+        with open(poses_f, "w") as handle:
+            for i_model, model in enumerate((ligand, shifted, ligand)):
+                handle.write("MODEL     {0:4d}\n".format(i_model + 1))
+                handle.writelines(model)
+                handle.write("ENDMDL\n")
+        yield receptor_f, poses_f
+
+
+def test_read_pdb_models(decoy_files):
+    """Test the reading of multi-model files."""
+    models = list(read_pdb_models(decoy_files[1]))
+
+    assert [m.name for m in models] == ["poses_1", "poses_2", "poses_3"]
+    assert np.allclose(models[1].coords[:, 0] - models[0].coords[:, 0], 100.0)
+    assert np.array_equal(models[0].coords, models[2].coords)
+
+
+def test_receptor_index(decoy_files):
+    """Test the decoy contacts against a full calculation."""
+    receptor_f, poses_f = decoy_files
+    index = ReceptorIndex(receptor_f)
+    pose = next(iter_poses(poses_f))
+
+    _, _, contacts, bins, ld = interface_features(Path(DATA_FOLDER, "complex.pdb"))
+    observed, _, observed_bins, observed_ld = index.features(pose)
+
+    assert len(observed) == len(contacts) == 71
+    assert observed_bins == bins
+    assert observed_ld == pytest.approx(ld)
+
+
+def test_score_poses(decoy_files):
+    """Test the streaming of poses through the classifier."""
+    receptor_f, poses_f = decoy_files
+    results = list(score_poses(receptor_f, poses_f, batch_size=2))
+
+    assert [r.as_dict()["ICs"] for r in results] == [71, 0, 71]
+    assert results[1].predicted_class is None
+    assert results[0].predicted_class == results[2].predicted_class
+    assert results[0].selection == ("E", "I")
+
+
+def test_score_poses_with_receptor(decoy_files):
+    """Test that the receptor chains are dropped from full complex poses."""
+    receptor_f, _ = decoy_files
+    complex_f = Path(DATA_FOLDER, "complex.pdb")
+    results = list(score_poses(receptor_f, [complex_f]))
+
+    assert results[0].as_dict()["ICs"] == 71
+    assert results[0].selection == ("E", "I")
+
+    with pytest.raises(ValueError):
+        list(score_poses(receptor_f, [complex_f], ligand_chains=["E", "I"]))
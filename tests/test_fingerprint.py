@@ -0,0 +1,95 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from prodigy_cryst.fingerprint import chain_interfaces, classify_interfaces
+from prodigy_cryst.modules import kernels
+from tests import DATA_FOLDER
+
+
+@pytest.fixture
+def arrays():
+    return kernels.read_structure(Path(DATA_FOLDER, "complex.pdb"))
+
+
+def _with_copy(arrays, copy_coords=None):
+    """Complex plus a rotated and translated copy with chains F and J."""
+    if copy_coords is None:
+        copy_coords = arrays.coords
+    angle = np.pi / 3
+    rot = np.array(
+        [
+            [np.cos(angle), -np.sin(angle), 0.0],
+            [np.sin(angle), np.cos(angle), 0.0],
+            [0.0, 0.0, 1.0],
+        ]
+    )
+    copy_residues = arrays.residues.copy()
+    copy_residues["chain"] = np.where(copy_residues["chain"] == "E", "F", "J")
+    return kernels.AtomArrays(
+        name="tetramer",
+        coords=np.concatenate([arrays.coords, copy_coords @ rot.T + 200.0]),
+        atom_names=np.concatenate([arrays.atom_names, arrays.atom_names]),
+        res_index=np.concatenate(
+            [arrays.res_index, arrays.res_index + len(arrays.residues)]
+        ),
+        residues=np.concatenate([arrays.residues, copy_residues]),
+    )
+
+
+@pytest.fixture
+def tetramer(arrays):
+    return _with_copy(arrays)
+
+
+def _assert_exact(result, arrays):
+    chain_a, chain_b = result.selection
+    expected = kernels.find_contacts(arrays, {chain_a: 0, chain_b: 1})
+    assert np.array_equal(result.contacts, expected)
+    assert result.bins == kernels.bin_contacts(expected, arrays.residues)
+    assert result.link_density == kernels.link_density(expected)
+
+
+def test_chain_interfaces(tetramer):
+    """Test the fingerprints of equivalent interfaces."""
+    interfaces = list(chain_interfaces(tetramer))
+
+    assert [set(i[:2]) for i in interfaces] == [{"E", "I"}, {"F", "J"}]
+    assert interfaces[0][2] == interfaces[1][2]
+
+
+def test_classify_interfaces(arrays, tetramer):
+    """Test that deduplicated interfaces match a direct calculation."""
+    results, report = classify_interfaces([tetramer, arrays])
+
+    assert report["interfaces"] == 3
+    assert report["unique"] == 1
+    assert report["rechecked"] == 0
+    for result in results:
+        _assert_exact(result, arrays if result.structure == "complex" else tetramer)
+        assert result.as_dict()["ICs"] == 71
+
+    _, report = classify_interfaces([tetramer], rmsd_cutoff=-1.0)
+    assert report["interfaces"] == report["unique"] == 2
+
+
+def test_classify_interfaces_perturbed(arrays):
+    """Test that perturbed copies keep their own contacts and features."""
+    noisy = arrays.coords + np.random.RandomState(0).normal(
+        scale=0.2, size=arrays.coords.shape
+    )
+    moved = arrays.coords.copy()
+    i_res = np.flatnonzero(
+        (arrays.residues["chain"] == "I") & (arrays.residues["resnum"] == 29)
+    )
+    moved[arrays.res_index == i_res[0]] += 2.0
+
+    structs = [_with_copy(arrays, noisy), _with_copy(arrays, moved)]
+    results, report = classify_interfaces(structs)
+
+    assert report["interfaces"] == 4
+    assert report["unique"] == 1
+    assert 0 < report["rechecked"] < report["mapped_pairs"]
+    for result, struct in zip(results, [s for s in structs for _ in range(2)]):
+        _assert_exact(result, struct)
@@ -1,13 +1,17 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 
 import pytest
 
 from prodigy_cryst.interface_classifier import (
+    ClassificationResult,
     ProdigyCrystal,
     analyse_contacts,
     calculate_ic,
+    classify,
+    interface_features,
 )
 from prodigy_cryst.modules.parsers import parse_structure
 from tests import DATA_FOLDER
@@ -133,3 +137,94 @@ def test_prodigycrystal_print_contacts(prodigyxtal, contact_list):
     assert observed_printed_contacts == expected_printed_contacts
 
     os.unlink(temp_f.name)
+
+
+def test_interface_features_threaded():
+    """Test that concurrent feature calculations match serial ones."""
+    paths = [Path(DATA_FOLDER, f) for f in ("complex.pdb", "ens_w_gaps.pdb")] * 8
+
+    serial = [interface_features(p)[2:] for p in paths]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        threaded = list(executor.map(lambda p: interface_features(p)[2:], paths))
+
+    for (c_s, bins_s, ld_s), (c_t, bins_t, ld_t) in zip(serial, threaded):
+        assert (c_s == c_t).all()
+        assert bins_s == bins_t
+        assert ld_s == ld_t
+
+    assert len(serial[0][0]) == 71
+    assert len(serial[1][0]) == 62
+
+
+def test_classify(parsed_structure):
+    """Test the re-entrant classification, serial and threaded."""
+    pdb_path = Path(DATA_FOLDER, "complex.pdb")
+    result = classify(pdb_path)
+
+    assert isinstance(result, ClassificationResult)
+    assert result.predicted_class == ("BIO", 0.804, 0.196)
+    assert result.as_dict()["ICs"] == 71
+    assert result.selection == ("E", "I")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(classify, [pdb_path, parsed_structure] * 4))
+
+    for threaded in results:
+        assert threaded.as_dict() == result.as_dict()
+
+
+def _assert_same_prediction(updated, structure):
+    reference = ProdigyCrystal(structure)
+    reference.predict()
+    assert set(updated.ic_network) == set(reference.ic_network)
+    assert len(updated.ic_network) == len(reference.ic_network)
+    assert updated.bins == reference.bins
+    assert updated.link_density == pytest.approx(reference.link_density, abs=0)
+    assert updated.predicted_class == reference.predicted_class
+
+
+def test_prodigycrystal_update(parsed_structure):
+    """Test that incremental updates match a full re-classification."""
+    prodigy = ProdigyCrystal(parsed_structure)
+    prodigy.predict()
+    interface_res = sorted(prodigy.ic_network)[10][0]
+    far_res = parsed_structure[0]["E"][20]
+
+    # Move an interface residue away, then back
+    original = [a.coord.copy() for a in interface_res]
+    for atom in interface_res:
+        atom.coord = atom.coord + 20.0
+    prodigy.update([interface_res])
+    _assert_same_prediction(prodigy, parsed_structure)
+
+    for atom, coord in zip(interface_res, original):
+        atom.coord = coord
+    prodigy.update([interface_res])
+    _assert_same_prediction(prodigy, parsed_structure)
+
+    # Point mutation to alanine
+    mutated = sorted(prodigy.ic_network)[3][1]
+    for atom in list(mutated):
+        if atom.get_id() not in ("N", "CA", "C", "O", "CB"):
+            mutated.detach_child(atom.get_id())
+    mutated.resname = "ALA"
+    prodigy.update([mutated, far_res])
+    _assert_same_prediction(prodigy, parsed_structure)
+
+
+def test_prodigycrystal_update_rebuild(parsed_structure):
+    """Test incremental updates across a rebuild of the spatial index."""
+    prodigy = ProdigyCrystal(parsed_structure)
+    prodigy.predict()
+    for i_pair in range(5):
+        res = sorted(prodigy.ic_network)[i_pair][0]
+        for atom in res:
+            atom.coord = atom.coord + 0.7
+        prodigy.update([res], max_stale=0.0)
+        _assert_same_prediction(prodigy, parsed_structure)
+
+
+def test_prodigycrystal_update_before_predict(prodigyxtal):
+    """Test that update requires a previous prediction."""
+    with pytest.raises(ValueError):
+        prodigyxtal.update([])
@@ -0,0 +1,125 @@
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+import numpy as np
+import pytest
+
+from prodigy_cryst.interface_classifier import analyse_contacts, calculate_ic
+from prodigy_cryst.modules.kernels import (
+    bin_contacts,
+    find_contacts,
+    link_density,
+    pair_distances,
+    read_pdb,
+    read_structure,
+    structure_arrays,
+)
+from prodigy_cryst.modules.parsers import parse_structure
+from tests import DATA_FOLDER
+
+
+@pytest.fixture(params=["complex.pdb", "ens_w_gaps.pdb"])
+def pdb_path(request):
+    return Path(DATA_FOLDER, request.param)
+
+
+def test_read_pdb(pdb_path):
+    """Test the array reader against the Biopython parser."""
+    s, _, n_res = parse_structure(pdb_path)
+    expected = structure_arrays(s)
+    observed = read_pdb(pdb_path)
+
+    assert observed.name == s.id
+    assert len(observed.residues) == n_res
+    assert np.array_equal(observed.coords, expected.coords)
+    assert np.array_equal(observed.atom_names, expected.atom_names)
+    assert np.array_equal(observed.res_index, expected.res_index)
+    assert np.array_equal(observed.residues, expected.residues)
+
+
+def test_read_pdb_cleaning():
+    """Test the removal of alternate locations, hydrogens and HETATMs."""
+    pdb_str = (
+        "ATOM      1  N   ALA A   1      11.104   6.134  -6.504  1.00  0.00           N\n"
+        "ATOM      2  CA AALA A   1      11.639   6.071  -5.147  0.40  0.00           C\n"
+        "ATOM      3  CA BALA A   1      11.700   6.000  -5.000  0.60  0.00           C\n"
+        "ATOM      4  H   ALA A   1      10.500   6.000  -6.800  1.00  0.00           H\n"
+        "ATOM      5  HB1 ALA A   1      10.500   6.000  -6.800  1.00  0.00\n"
+        "HETATM    6  O   HOH A 101       1.000   2.000   3.000  1.00  0.00           O\n"
+    )
+    temp_f = NamedTemporaryFile(delete=False, suffix=".pdb", mode="w")
+    temp_f.write(pdb_str)
+    temp_f.close()
+
+    arrays = read_pdb(temp_f.name)
+
+    assert arrays.atom_names.tolist() == ["N", "CA"]
+    assert arrays.coords[1].tolist() == pytest.approx([11.7, 6.0, -5.0])
+    assert len(arrays.residues) == 1
+
+    # Point mutation: Biopython keeps the residue named last
+    with open(temp_f.name, "w") as handle:
+        handle.write(
+            "ATOM      1  N  ASER A   2      12.104   7.134  -6.504  0.60  0.00"
+            "           N\n"
+            "ATOM      2  CA ASER A   2      12.639   7.071  -5.147  0.60  0.00"
+            "           C\n"
+            "ATOM      3  OG ASER A   2      13.639   7.071  -5.147  0.60  0.00"
+            "           O\n"
+            "ATOM      4  N  BGLY A   2      12.204   7.234  -6.604  0.40  0.00"
+            "           N\n"
+            "ATOM      5  CA BGLY A   2      12.739   7.171  -5.247  0.40  0.00"
+            "           C\n"
+        )
+    arrays = read_pdb(temp_f.name)
+    structure, _, _ = parse_structure(temp_f.name)
+    expected = structure_arrays(structure)
+
+    assert arrays.residues["resname"].tolist() == ["GLY"]
+    assert np.array_equal(arrays.residues, expected.residues)
+    assert np.array_equal(arrays.atom_names, expected.atom_names)
+    assert np.array_equal(arrays.coords, expected.coords)
+
+    with open(temp_f.name, "a") as handle:
+        handle.write(pdb_str.replace("ALA", "MSE"))
+    with pytest.raises(ValueError):
+        read_pdb(temp_f.name)
+
+    os.unlink(temp_f.name)
+
+
+def test_find_contacts(pdb_path):
+    """Test the array contact search and binning against the Biopython ones."""
+    s, _, _ = parse_structure(pdb_path)
+    ic_list = calculate_ic(s)
+    arrays = read_structure(pdb_path)
+
+    contacts = find_contacts(arrays, {"E": 0, "I": 1})
+    residues = arrays.residues
+    observed = set(
+        tuple(residues[i][["chain", "resnum"]].tolist() for i in pair)
+        for pair in contacts
+    )
+    expected = set(tuple((r.parent.id, r.id[1]) for r in pair) for pair in ic_list)
+    assert observed == expected
+
+    assert bin_contacts(contacts, residues) == analyse_contacts(ic_list)
+
+    list1, list2 = zip(*ic_list)
+    expected_ld = len(ic_list) / (len(set(list1)) * len(set(list2)))
+    assert link_density(contacts) == pytest.approx(expected_ld)
+
+
+def test_pair_distances(pdb_path):
+    """Test the minimum distances of residue pairs against a brute force."""
+    arrays = read_structure(pdb_path)
+    pairs = np.array([[0, 1], [3, 200], [5, 5], [10, 150]])
+    expected = []
+    for i, j in pairs:
+        xyz_i = arrays.coords[arrays.res_index == i]
+        xyz_j = arrays.coords[arrays.res_index == j]
+        expected.append(((xyz_i[:, None] - xyz_j[None]) ** 2).sum(axis=2).min())
+
+    assert np.array_equal(pair_distances(arrays, pairs), expected)
+    assert np.array_equal(pair_distances(arrays, pairs, block=10), expected)
@@ -1,9 +1,10 @@
 from pathlib import Path
 
 import pytest
+from Bio.PDB.Polypeptide import PPBuilder
 from Bio.PDB.Structure import Structure
 
-from prodigy_cryst.modules.parsers import parse_structure
+from prodigy_cryst.modules.parsers import detect_gaps, parse_structure
 
 from . import DATA_FOLDER
 
@@ -28,3 +29,29 @@ def test_parse_structure():
     assert isinstance(s_gaps, Structure)
     assert n_chains_gaps == 2
     assert n_res_gaps == 247
+
+
+def test_detect_gaps():
+    """Test the backbone gap detection against Biopython's PPBuilder."""
+
+    for fname in ("complex.pdb", "ens_w_gaps.pdb"):
+        s, _, _ = parse_structure(Path(DATA_FOLDER, fname))
+        fragments = detect_gaps(s[0])
+        peptides = PPBuilder().build_peptides(s)
+
+        assert [(f[0], f[1]) for f in fragments] == [(p[0], p[-1]) for p in peptides]
+
+    s_gaps, _, _ = parse_structure(Path(DATA_FOLDER, "ens_w_gaps.pdb"))
+    fragments = detect_gaps(s_gaps[0])
+    assert len(fragments) == 3
+    assert fragments[1][0].id[1] == 216
+
+
+def test_parse_structure_gap_warnings(caplog):
+    """Test the gap report of the structure parser."""
+
+    parse_structure(Path(DATA_FOLDER, "ens_w_gaps.pdb"))
+
+    assert "[!] Structure contains gaps:" in caplog.messages
+    assert "\tE GLY216 < Fragment 1 > E ASN245" in caplog.messages
+    assert "\tI ARG1 < Fragment 2 > I GLY29" in caplog.messages
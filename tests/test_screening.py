@@ -0,0 +1,96 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from prodigy_cryst.interface_classifier import classify
+from prodigy_cryst.modules.kernels import read_structure, reduced_arrays
+from prodigy_cryst.screening import approximate_features, calibrate_cutoff, screen
+from tests import DATA_FOLDER
+
+
+@pytest.fixture
+def pdb_paths():
+    return [Path(DATA_FOLDER, f) for f in ("complex.pdb", "ens_w_gaps.pdb")]
+
+
+def test_reduced_arrays(pdb_paths):
+    """Test the side-chain centroid representation."""
+    arrays = read_structure(pdb_paths[0])
+    reduced = reduced_arrays(arrays)
+
+    assert len(reduced.coords) == len(arrays.residues)
+
+    i_gly = np.flatnonzero(arrays.residues["resname"] == "GLY")[0]
+    ca = (arrays.res_index == i_gly) & (arrays.atom_names == "CA")
+    assert np.allclose(reduced.coords[i_gly], arrays.coords[ca][0])
+
+    i_ala = np.flatnonzero(arrays.residues["resname"] == "ALA")[0]
+    cb = (arrays.res_index == i_ala) & (arrays.atom_names == "CB")
+    assert np.allclose(reduced.coords[i_ala], arrays.coords[cb][0])
+
+
+def test_approximate_features(pdb_paths):
+    """Test the approximate contacts."""
+    _, selection, contacts, bins, ld = approximate_features(pdb_paths[0])
+
+    assert selection == ["E", "I"]
+    assert abs(len(contacts) - 71) < 0.2 * 71
+    assert sum(bins[x] for x in ("AA", "PP", "CC", "AP", "CP", "AC")) == len(contacts)
+    assert 0 < ld < 1
+
+
+def test_calibrate_cutoff(pdb_paths):
+    """Test the calibration of the centroid cutoff on a known answer."""
+    # Structures of centroids only: the exact and approximate contacts are the
+    # same when both use the same cutoff
+    reduced = [reduced_arrays(read_structure(p)) for p in pdb_paths]
+    cutoffs = [5.0, 6.0, 7.0, 8.0, 9.0]
+
+    assert calibrate_cutoff(reduced, d_cutoff=7.0, cutoffs=cutoffs) == 7.0
+    assert calibrate_cutoff(reduced, d_cutoff=8.0, cutoffs=cutoffs) == 8.0
+
+
+def test_screen(pdb_paths):
+    """Test the approximate screening and its full-atom fallback."""
+    exact = [classify(path) for path in pdb_paths]
+
+    approx_results, report = screen(pdb_paths, band=0.0, compare=True)
+
+    assert report["fallbacks"] == 0
+    assert report["fallback_rate"] == 0.0
+    assert all(result.approximate for result in approx_results)
+    agreement = np.mean(
+        [
+            a.predicted_class[0] == e.predicted_class[0]
+            for a, e in zip(approx_results, exact)
+        ]
+    )
+    assert report["agreement"] == pytest.approx(agreement)
+
+    results, report = screen(pdb_paths, band=0.5, compare=True, chunk_size=1)
+
+    assert report["fallbacks"] == report["interfaces"] == 2
+    assert report["agreement"] == pytest.approx(agreement)
+    for result, expected in zip(results, exact):
+        assert not result.approximate
+        assert result.as_dict() == expected.as_dict()
+
+
+def test_screen_no_contacts(pdb_paths):
+    """Test that interfaces without contacts do not stop the batch."""
+    arrays = read_structure(pdb_paths[0])
+    apart = arrays._replace(
+        name="apart",
+        coords=np.where(
+            (arrays.residues["chain"][arrays.res_index] == "I")[:, None],
+            arrays.coords + 100.0,
+            arrays.coords,
+        ),
+    )
+    results, report = screen([apart, arrays], compare=True)
+
+    assert report["interfaces"] == 2
+    assert results[0].predicted_class is None
+    assert results[0].as_dict()["ICs"] == 0
+    assert results[1].predicted_class is not None
@@ -0,0 +1,85 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from prodigy_cryst.interface_classifier import interface_features
+from prodigy_cryst.training import (
+    feature_columns,
+    feature_version,
+    load_feature_table,
+    regenerate_features,
+    retrain,
+    training_matrix,
+    write_feature_table,
+)
+from tests import DATA_FOLDER
+
+
+def test_load_feature_table():
+    """Test the loading of the shipped training set."""
+    entries, columns, matrix, labels = load_feature_table()
+
+    assert len(entries) == len(matrix) == len(labels) == 5735
+    assert entries[0] == "1o9d_1"
+
+    x = training_matrix(columns, matrix)
+    assert x.shape == (5735, 22)
+    assert x[0, 0] == 6  # CP
+    assert x[0, -1] == 0.1015  # LD
+    assert set(labels) == {0, 1}
+
+
+def test_retrain():
+    """Test the cross-validated retraining."""
+    _, columns, matrix, labels = load_feature_table()
+    x = training_matrix(columns, matrix)[::10]
+    model, report = retrain(x, labels[::10], n_estimators=10, cv=2, n_jobs=1)
+
+    assert report["samples"] == len(x)
+    assert len(report["cv_accuracy"]) == 2
+    assert report["cv_accuracy_mean"] > 0.7
+    assert model.predict_proba(x[:2]).shape == (2, 2)
+
+
+def test_regenerate_features():
+    """Test the cached feature regeneration and the feature table."""
+    with TemporaryDirectory() as tmpdir:
+        shutil.copy(Path(DATA_FOLDER, "complex.pdb"), Path(tmpdir, "1ppe_1.pdb"))
+        cache_dir = os.path.join(tmpdir, "cache")
+
+        features = regenerate_features(
+            ["1ppe_1", "none_1"], tmpdir, cache_dir=cache_dir, n_jobs=1
+        )
+        _, _, contacts, bins, ld = interface_features(Path(DATA_FOLDER, "complex.pdb"))
+
+        assert features["1ppe_1"]["IC"] == len(contacts) == 71
+        assert features["1ppe_1"]["link_density"] == ld
+        assert features["1ppe_1"]["CP"] == bins["CP"]
+        assert features["none_1"]["error"] == "structure not found"
+
+        # Up to date cache entries are reused
+        cache_f = Path(cache_dir, "1ppe_1.json")
+        cached = json.loads(cache_f.read_text())
+        assert cached["version"] == feature_version()
+        cached["IC"] = -1
+        cache_f.write_text(json.dumps(cached))
+        features = regenerate_features(["1ppe_1"], tmpdir, cache_dir=cache_dir)
+        assert features["1ppe_1"]["IC"] == -1
+
+        table_f = os.path.join(tmpdir, "features.csv")
+        write_feature_table(features, {"1ppe_1": "BIO"}, table_f)
+        entries, columns, matrix, labels = load_feature_table(table_f)
+
+        assert entries.tolist() == ["1ppe_1"]
+        assert labels.tolist() == [0]
+        assert training_matrix(columns, matrix).shape == (1, len(feature_columns))
+        assert np.isclose(matrix[0, columns.index("LD")], ld)
+
+        # Replaced structures are recomputed
+        shutil.copy(Path(DATA_FOLDER, "ens_w_gaps.pdb"), Path(tmpdir, "1ppe_1.pdb"))
+        features = regenerate_features(["1ppe_1"], tmpdir, cache_dir=cache_dir)
+        assert features["1ppe_1"]["IC"] == 62
@@ -0,0 +1,212 @@
+import csv
+import gzip
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from prodigy_cryst.interface_classifier import ClassificationResult, interface_features
+from prodigy_cryst.modules.writers import QueueWriter, ResultWriter, flatten_result
+from tests import DATA_FOLDER
+
+
+def _result(name="complex"):
+    arrays, selection, contacts, bins, ld = interface_features(
+        Path(DATA_FOLDER, "complex.pdb")
+    )
+    return ClassificationResult(
+        structure=name,
+        selection=tuple(selection),
+        contacts=contacts,
+        residues=arrays.residues,
+        bins=bins,
+        link_density=ld,
+        predicted_class=("BIO", 0.804, 0.196),
+    )
+
+
+_queue = None
+
+
+def _init_worker(queue):
+    global _queue
+    _queue = queue
+
+
+def _worker(name):
+    row = flatten_result(_result(name), timings={"total": 0.1})
+    _queue.put(row)
+    return name
+
+
+def _append_worker(args):
+    path, name = args
+    with ResultWriter(path, append=True, resume=False) as writer:
+        writer.write(_result(name))
+    return name
+
+
+def test_flatten_result():
+    """Test the conversion of results to rows."""
+    row = flatten_result(_result(), timings={"total": 0.5})
+
+    assert list(row)[:7] == [
+        "structure",
+        "selection",
+        "ICs",
+        "link_density",
+        "class",
+        "p_bio",
+        "p_xtal",
+    ]
+    assert row["selection"] == "E I"
+    assert row["ICs"] == 71
+    assert row["p_xtal"] == 0.196
+    assert row["time_total"] == 0.5
+    assert row["AA"] == 20
+
+
+@pytest.mark.parametrize("fname", ["out.csv", "out.tsv.gz", "out.jsonl"])
+def test_result_writer(fname):
+    """Test the writing, appending and resuming of result files."""
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, fname)
+        with ResultWriter(path) as writer:
+            writer.write(_result("s1"), timings={"total": 1.0})
+
+        with ResultWriter(path, append=True) as writer:
+            assert writer.done == {"s1\tE I"}
+            writer.write(_result("s2"), timings={"total": 2.0})
+
+        opener = gzip.open if fname.endswith(".gz") else open
+        with opener(path, "rt", newline="") as handle:
+            if fname.endswith(".jsonl"):
+                rows = [json.loads(line) for line in handle]
+            else:
+                delimiter = "\t" if ".tsv" in fname else ","
+                rows = list(csv.DictReader(handle, delimiter=delimiter))
+
+        assert [r["structure"] for r in rows] == ["s1", "s2"]
+        assert [float(r["time_total"]) for r in rows] == [1.0, 2.0]
+        assert int(rows[1]["ICs"]) == 71
+
+
+def test_result_writer_format():
+    """Test the rejection of unknown formats."""
+    with pytest.raises(ValueError):
+        ResultWriter("results.xlsx")
+
+
+def test_queue_writer():
+    """Test a single writer fed by several processes."""
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "out.csv")
+        names = ["s{0}".format(i) for i in range(8)]
+        with QueueWriter(path) as writer:
+            with ProcessPoolExecutor(
+                max_workers=2, initializer=_init_worker, initargs=(writer.queue,)
+            ) as executor:
+                assert sorted(executor.map(_worker, names)) == names
+
+        with open(path, newline="") as handle:
+            rows = list(csv.DictReader(handle))
+
+        assert sorted(r["structure"] for r in rows) == names
+        assert all(r["ICs"] == "71" for r in rows)
+
+
+@pytest.mark.parametrize("fname", ["out.csv", "out.tsv.gz", "out.jsonl"])
+def test_result_writer_resume_partial(fname):
+    """Test that a partial last row is dropped before appending."""
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, fname)
+        with ResultWriter(path) as writer:
+            writer.write(_result("s1"))
+        size = os.path.getsize(path)
+        with ResultWriter(path, append=True) as writer:
+            writer.write(_result("s2"))
+
+        # Interrupted run: cut the file in the middle of the last row
+        with open(path, "r+b") as handle:
+            handle.truncate((size + os.path.getsize(path)) // 2)
+
+        with ResultWriter(path, append=True) as writer:
+            assert writer.done == {"s1\tE I"}
+            writer.write(_result("s3"))
+
+        opener = gzip.open if fname.endswith(".gz") else open
+        with opener(path, "rt", newline="") as handle:
+            if fname.endswith(".jsonl"):
+                rows = [json.loads(line) for line in handle]
+            else:
+                delimiter = "\t" if ".tsv" in fname else ","
+                rows = list(csv.DictReader(handle, delimiter=delimiter))
+
+        assert [r["structure"] for r in rows] == ["s1", "s3"]
+        assert all(int(r["ICs"]) == 71 for r in rows)
+
+
+def test_result_writer_new_columns():
+    """Test appending rows with columns missing from the header."""
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "out.csv")
+        with ResultWriter(path) as writer:
+            writer.write(_result("s1"))
+        with ResultWriter(path, append=True) as writer:
+            writer.write(_result("s2"), timings={"parse": 1.0})
+
+        with open(path, newline="") as handle:
+            rows = list(csv.DictReader(handle))
+
+        assert [r["structure"] for r in rows] == ["s1", "s2"]
+        assert "time_parse" not in rows[1]
+
+
+def test_queue_writer_error():
+    """Test that writing errors are raised when closing the writer."""
+    with TemporaryDirectory() as tmpdir:
+        writer = QueueWriter(os.path.join(tmpdir, "out.csv"))
+        writer.queue.put({"structure": "s1"})
+        with pytest.raises(KeyError):
+            writer.close()
+
+
+@pytest.mark.parametrize("fname", ["out.csv", "out.jsonl"])
+def test_result_writer_append_no_resume(fname):
+    """Test appending without reading back the existing rows."""
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, fname)
+        with ResultWriter(path) as writer:
+            writer.write(_result("s1"))
+        with open(path, "a") as handle:
+            handle.write("s2,E I,7")
+
+        with ResultWriter(path, append=True, resume=False) as writer:
+            assert writer.done == set()
+            writer.write(_result("s3"))
+
+        with open(path, newline="") as handle:
+            if fname.endswith(".jsonl"):
+                rows = [json.loads(line) for line in handle]
+            else:
+                rows = list(csv.DictReader(handle))
+
+        assert [r["structure"] for r in rows] == ["s1", "s3"]
+
+
+def test_result_writer_concurrent_append():
+    """Test several processes appending to the same file."""
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "out.csv")
+        names = ["s{0}".format(i) for i in range(8)]
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            list(executor.map(_append_worker, [(path, n) for n in names]))
+
+        with open(path, newline="") as handle:
+            rows = list(csv.DictReader(handle))
+
+        assert sorted(r["structure"] for r in rows) == names
+        assert all(r["ICs"] == "71" for r in rows)